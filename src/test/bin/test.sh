@@ -69,19 +69,21 @@ WHERE t.relname = '${PARTITION_NAME_PURE}'
 INDEXES_TO_DROP=$(docker exec "${CONTAINER_NAME}" \
   psql -U "${DB_USER}" -d "${DB_NAME}" -tA -c "${GET_INDEXES_SQL}")
 
-# 3. 循环删除索引
+# 3. 在一条 DROP INDEX 语句中删除全部索引 (只启动一次 docker exec + psql，而不是每个索引一次)
 if [[ -n "$INDEXES_TO_DROP" ]]; then
     echo "发现以下辅助索引，准备删除:"
     echo "${INDEXES_TO_DROP}"
 
+    DROP_INDEX_LIST=""
     IFS=$'\n'
     for IDX in $INDEXES_TO_DROP; do
         echo " -> Dropping index: ${IDX} ..."
-        docker exec "${CONTAINER_NAME}" \
-          psql -U "${DB_USER}" -d "${DB_NAME}" \
-          -c "DROP INDEX IF EXISTS \"public\".\"${IDX}\";"
+        DROP_INDEX_LIST="${DROP_INDEX_LIST:+${DROP_INDEX_LIST}, }\"public\".\"${IDX}\""
     done
     unset IFS
+    docker exec "${CONTAINER_NAME}" \
+      psql -U "${DB_USER}" -d "${DB_NAME}" \
+      -c "DROP INDEX IF EXISTS ${DROP_INDEX_LIST};"
     echo "辅助索引删除完毕。"
 else
     echo "未发现需要删除的辅助索引 (可能已经被删除或仅剩主键)。"
@@ -116,28 +118,14 @@ echo "主键重置完毕。"
 # ==============================================================================
 echo ">>> 步骤 2: 开始执行数据导入事务..."
 
-LOCK_TABLE_NAME="\"public\".\"${TARGET_TABLE_BASE}_wa\""
-
-time ( \
-    ( \
-        echo "BEGIN;"; \
-        echo "LOCK TABLE ${LOCK_TABLE_NAME} IN SHARE UPDATE EXCLUSIVE MODE;"; \
-        echo "COPY public.${PARTITION_NAME}(fid,geom,dtg,taxi_id) FROM STDIN WITH (FORMAT text, DELIMITER '|', NULL '');"; \
-
-        # 1. 输出文件内容
-        cat "${FILE_PATH}"; \
-
-        # 2. 智能补全换行符
-        if [ -n "$(tail -c 1 "${FILE_PATH}")" ]; then
-            echo ""
-        fi
-
-        # 3. 输出结束标记
-        echo "\."; \
-        echo "COMMIT;"; \
-    ) | docker exec -i "${CONTAINER_NAME}" \
-        psql -U "${DB_USER}" -d "${DB_NAME}" -q -v ON_ERROR_STOP=1 \
-)
+# 数据文件直接重定向为 psql 的标准输入 (不经过子 shell 和 cat)，COPY ... FROM STDIN 读到文件末尾即结束，
+# 无需追加结束标记 \. 和补换行符。单条 COPY 本身即是一个事务，失败时整体回滚。
+# 不再对 _wa 父表加 SHARE UPDATE EXCLUSIVE 锁: 该锁与自身互斥，会使多个并发导入相互排队；
+# COPY 自带的 ROW EXCLUSIVE 锁互相兼容。导入期间分区滚动等 pg_cron 任务应先用 disable_geomesa_features.sh 暂停
+time docker exec -i "${CONTAINER_NAME}" \
+    psql -U "${DB_USER}" -d "${DB_NAME}" -q -v ON_ERROR_STOP=1 \
+    -c "COPY public.${PARTITION_NAME}(fid,geom,dtg,taxi_id) FROM STDIN WITH (FORMAT text, DELIMITER '|', NULL '');" \
+    < "${FILE_PATH}"
 
 echo ">>> 数据导入成功！"
 
@@ -13,6 +13,8 @@ import org.geotools.feature.simple.SimpleFeatureBuilder;
 import org.geotools.geometry.jts.JTSFactoryFinder;
 import org.junit.jupiter.api.Test;
 import org.locationtech.jts.geom.Geometry;
+import org.locationtech.jts.io.ParseException;
+import org.locationtech.jts.io.WKBReader;
 import org.locationtech.jts.io.WKTReader;
 import org.opengis.feature.simple.SimpleFeature;
 import org.opengis.feature.simple.SimpleFeatureType;
@@ -188,8 +190,9 @@ public class IngestDataSshTest {
         SimpleFeatureType sft = ds.getSchema(typeName);
         SimpleFeatureBuilder featureBuilder = new SimpleFeatureBuilder(sft);
 
-        // 几何对象解析器
+        // 几何对象解析器 (新版 .tbl 为十六进制 EWKB，旧版为 WKT)
         WKTReader wktReader = new WKTReader(JTSFactoryFinder.getGeometryFactory());
+        WKBReader wkbReader = new WKBReader(JTSFactoryFinder.getGeometryFactory());
 
         // 时间格式解析器
         SimpleDateFormat dateFormat = new SimpleDateFormat("yyyy-MM-dd HH:mm:ss");
@@ -225,19 +228,13 @@ public class IngestDataSshTest {
 
             for (CSVRecord record : parser) {
                 try {
-                    // 数据格式: UUID | SRID=4326;POINT(x y) | Time | ...
+                    // 数据格式: UUID | 十六进制 EWKB 或 SRID=4326;POINT(x y) | Time | ...
 
                     // A. 获取 UUID (第0列)
                     String originalId = record.get(0);
 
                     // B. 解析 Geometry (第1列)
-                    String rawWkt = record.get(1);
-                    String cleanWkt = rawWkt;
-                    // 去除 SRID=4326; 前缀
-                    if (rawWkt.contains(";")) {
-                        cleanWkt = rawWkt.split(";")[1];
-                    }
-                    Geometry geometry = wktReader.read(cleanWkt);
+                    Geometry geometry = parseGeometry(record.get(1), wktReader, wkbReader);
 
                     // C. 解析时间 (第2列)
                     Date date = dateFormat.parse(record.get(2));
@@ -267,6 +264,19 @@ public class IngestDataSshTest {
 
     // --- 工具方法 ---
 
+    /**
+     * 解析 .tbl 的 geom 列: csv_to_tbl_converter 新生成的文件为十六进制 EWKB，旧文件为 SRID=4326;POINT(x y)
+     */
+    private static Geometry parseGeometry(String rawGeom, WKTReader wktReader, WKBReader wkbReader) throws ParseException {
+        if (rawGeom.startsWith("SRID=") || rawGeom.startsWith("POINT")) {
+            // 去除 SRID=4326; 前缀
+            String cleanWkt = rawGeom.contains(";") ? rawGeom.split(";")[1] : rawGeom;
+            return wktReader.read(cleanWkt);
+        }
+        // WKBReader 能识别 EWKB 中的 SRID 标志位
+        return wkbReader.read(WKBReader.hexToBytes(rawGeom));
+    }
+
     private List<String> getAllFileNames(String path) throws Exception {
         if (path.contains("@")) {
             SshInfo info = parseSshPath(path);
@@ -13,6 +13,8 @@ import org.geotools.feature.simple.SimpleFeatureBuilder;
 import org.geotools.geometry.jts.JTSFactoryFinder;
 import org.junit.jupiter.api.Test;
 import org.locationtech.jts.geom.Geometry;
+import org.locationtech.jts.io.ParseException;
+import org.locationtech.jts.io.WKBReader;
 import org.locationtech.jts.io.WKTReader;
 import org.opengis.feature.simple.SimpleFeature;
 import org.opengis.feature.simple.SimpleFeatureType;
@@ -112,6 +114,8 @@ public class IngestDataTest {
 
         // 专门用于解析 "POINT(116.3 39.8)" 这种字符串
         WKTReader wktReader = new WKTReader(JTSFactoryFinder.getGeometryFactory());
+        // 解析新版 .tbl 中十六进制 EWKB 形式的 geom
+        WKBReader wkbReader = new WKBReader(JTSFactoryFinder.getGeometryFactory());
 
         SimpleDateFormat dateFormat = new SimpleDateFormat("yyyy-MM-dd HH:mm:ss");
         dateFormat.setTimeZone(TimeZone.getTimeZone("Asia/Shanghai"));
@@ -147,20 +151,13 @@ public class IngestDataTest {
         ) {
             for (CSVRecord record : parser) {
                 try {
-                    // 数据格式: UUID | SRID=4326;POINT(x y) | Time | ID?
+                    // 数据格式: UUID | 十六进制 EWKB 或 SRID=4326;POINT(x y) | Time | ID?
 
                     // 1. 获取 ID (第0列)
                     String originalId = record.get(0);
 
                     // 2. 解析 Geometry (第1列)
-                    String rawWkt = record.get(1);
-                    String cleanWkt = rawWkt;
-
-                    // JTS WKTReader 不认识 "SRID=4326;" 前缀，需要切掉
-                    if (rawWkt.contains(";")) {
-                        cleanWkt = rawWkt.split(";")[1];
-                    }
-                    Geometry geometry = wktReader.read(cleanWkt);
+                    Geometry geometry = parseGeometry(record.get(1), wktReader, wkbReader);
 
                     // 3. 解析时间 (第2列)
                     Date date = dateFormat.parse(record.get(2));
@@ -194,6 +191,19 @@ public class IngestDataTest {
         }
     }
 
+    /**
+     * 解析 .tbl 的 geom 列: csv_to_tbl_converter 新生成的文件为十六进制 EWKB，旧文件为 SRID=4326;POINT(x y)
+     */
+    private static Geometry parseGeometry(String rawGeom, WKTReader wktReader, WKBReader wkbReader) throws ParseException {
+        if (rawGeom.startsWith("SRID=") || rawGeom.startsWith("POINT")) {
+            // JTS WKTReader 不认识 "SRID=4326;" 前缀，需要切掉
+            String cleanWkt = rawGeom.contains(";") ? rawGeom.split(";")[1] : rawGeom;
+            return wktReader.read(cleanWkt);
+        }
+        // WKBReader 能识别 EWKB 中的 SRID 标志位
+        return wkbReader.read(WKBReader.hexToBytes(rawGeom));
+    }
+
     private List<String> getFilesFromLocalFolder() throws IOException {
         List<String> filenames = new ArrayList<>();
         Path folder = Paths.get(datasetPath);
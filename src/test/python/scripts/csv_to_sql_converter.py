@@ -1,7 +1,18 @@
 import os
-import csv
 from datetime import datetime
 
+def parse_dtg(dtg_str):
+    """
+    按固定格式 '%Y-%m-%d %H:%M:%S' 解析时间字符串。
+    直接按位置切片转整数，省去 datetime.strptime 每次解析格式串和正则匹配的开销。
+    """
+    fields = (dtg_str[0:4], dtg_str[5:7], dtg_str[8:10], dtg_str[11:13], dtg_str[14:16], dtg_str[17:19])
+    # int() 还接受正负号、空白和下划线 (如 '+1'、' 1'、'1_0')，因此逐段检查是否全为数字
+    if (len(dtg_str) != 19 or dtg_str[4] != '-' or dtg_str[7] != '-' or dtg_str[10] != ' '
+            or dtg_str[13] != ':' or dtg_str[16] != ':' or not all(field.isdigit() for field in fields)):
+        raise ValueError(f"time data '{dtg_str}' does not match format '%Y-%m-%d %H:%M:%S'")
+    return datetime(*map(int, fields))
+
 def generate_sql_from_csv_folder(input_folder):
     """
     读取一个文件夹中的所有CSV文件，将每一行转换为SQL INSERT语句，
@@ -64,32 +75,35 @@ def process_single_csv(csv_path, sql_path):
     statement_count = 0
     # 注意：这种方式在非Windows系统上可能会因路径分隔符'\'而出错
     taxi_id = int(os.path.basename(csv_path).split('.')[0])
-    with open(csv_path, mode='r', encoding='utf-8') as infile, \
-         open(sql_path, mode='w', encoding='utf-8') as outfile:
+    # 表头固定为 5 列且字段中没有引号/逗号，无需 csv.reader 的逐字符状态机：
+    # 整个文件一次读入，再用 C 实现的 bytes.split 切分行和字段
+    with open(csv_path, mode='rb') as infile:
+        lines = infile.read().split(b'\n')
+    if lines[-1] == b'':
+        lines.pop()
 
-        # 根据您提供的CSV示例，分隔符是制表符(Tab)
-        csv_reader = csv.reader(infile, delimiter=',')
+    with open(sql_path, mode='w', encoding='utf-8') as outfile:
 
         # 跳过表头
-        try:
-            header = next(csv_reader)
-            # 验证表头是否符合预期（可选，但推荐）
-            expected_header = ['dtg_str', 'lat', 'lng', 'speed', 'geohash']
-            if header != expected_header:
-                 print(f"  警告: 文件 '{os.path.basename(csv_path)}' 的表头与预期不符。当前表头: {header}")
-        except StopIteration:
+        if not lines:
             print(f"  警告: 文件 '{os.path.basename(csv_path)}' 是空的。")
             return
+        header = lines[0].rstrip(b'\r').decode('utf-8').split(',')
+        # 验证表头是否符合预期（可选，但推荐）
+        expected_header = ['dtg_str', 'lat', 'lng', 'speed', 'geohash']
+        if header != expected_header:
+             print(f"  警告: 文件 '{os.path.basename(csv_path)}' 的表头与预期不符。当前表头: {header}")
 
         # 逐行处理数据
-        for j, row in enumerate(csv_reader, start=1):
+        for j, line in enumerate(lines[1:], start=1):
+            row = line.rstrip(b'\r').split(b',', 4)
             try:
-                dtg_str = row[0]
+                dtg_str = row[0].decode('utf-8')
                 lat_str = row[1]
                 lng_str = row[2]
 
                 # 注意：如果您的日期格式再次变化，这里可能需要修改
-                sql_dtg = datetime.strptime(dtg_str, '%Y-%m-%d %H:%M:%S')
+                sql_dtg = parse_dtg(dtg_str)
 
                 lat = float(lat_str)
                 lng = float(lng_str)
@@ -108,7 +122,7 @@ def process_single_csv(csv_path, sql_path):
 
             except (ValueError, IndexError) as e:
                 # 在报错信息中加入行号，方便定位
-                print(f"  [行号: {j+1}] 跳过该行，因为格式错误: {row} -> 错误: {e}")
+                print(f"  [行号: {j+1}] 跳过该行，因为格式错误: {line.decode('utf-8', errors='replace')} -> 错误: {e}")
 
     print(f"  处理完成，成功生成 {statement_count} 条 INSERT 语句到 '{os.path.basename(sql_path)}'。")
 
@@ -1,15 +1,245 @@
 import os
-import csv
-from datetime import datetime
-import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def generate_tbl_from_csv_folder(input_folder):
+import numpy as np
+from numba import njit, prange
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import zstandard
+
+from tbl_format import IO_BUFFER_SIZE, PGCOPY_HEADER, PGCOPY_TRAILER, ROWS_SUFFIX
+
+EXPECTED_HEADER = ['dtg_str', 'lat', 'lng', 'speed', 'geohash']
+# CSV 中时间列的格式 (与逐行解析时 datetime.strptime 使用的格式相同)
+DTG_FORMAT = '%Y-%m-%d %H:%M:%S'
+# float() 可以解析的经纬度文本 (不含首尾空白)，用于在整列转换失败时找出无法解析的值
+FLOAT_TEXT_PATTERN = r'^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$|^[+-]?(?i:nan|inf|infinity)$'
+
+# 压缩输出 (.tbl.zst) 使用的 zstd 压缩级别，低级别压缩足够快，不会成为转换瓶颈
+ZSTD_LEVEL = 3
+
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+UUID_TEXT_LEN = 36
+
+def hex_encode(raw):
+    """将形状为 (n, k) 的 uint8 数组按行查表转换为 (n, 2k) 的小写十六进制文本"""
+    hex_chars = np.empty((raw.shape[0], raw.shape[1] * 2), dtype=np.uint8)
+    hex_chars[:, 0::2] = HEX_DIGITS[raw >> 4]
+    hex_chars[:, 1::2] = HEX_DIGITS[raw & 0x0f]
+    return hex_chars
+
+def random_uuid_raw(n):
+    """
+    一次 os.urandom 取出 n 个 UUID 的全部随机字节，用 NumPy 设置版本4/变体位，
+    返回形状为 (n, 16) 的 uint8 数组，避免逐行构造 uuid.UUID 对象。
+    """
+    raw = np.frombuffer(os.urandom(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0f) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3f) | 0x80
+    return raw
+
+def uuid_text_bytes(raw):
+    """将 random_uuid_raw 生成的字节格式化为 8-4-4-4-12 的 UUID 文本，返回形状为 (n, 36) 的 uint8 数组"""
+    n = len(raw)
+    hex_chars = hex_encode(raw)
+
+    # 在固定位置插入 '-'，得到 8-4-4-4-12 的定长文本
+    text = np.full((n, UUID_TEXT_LEN), ord('-'), dtype=np.uint8)
+    text[:, 0:8] = hex_chars[:, 0:8]
+    text[:, 9:13] = hex_chars[:, 8:12]
+    text[:, 14:18] = hex_chars[:, 12:16]
+    text[:, 19:23] = hex_chars[:, 16:20]
+    text[:, 24:36] = hex_chars[:, 20:32]
+    return text
+
+# 小端 EWKB 点: 字节序(1) + 类型(Point | SRID 标志) + SRID + x + y，共 25 字节
+EWKB_POINT_DTYPE = np.dtype([
+    ('byte_order', 'u1'), ('type', '<u4'), ('srid', '<u4'), ('x', '<f8'), ('y', '<f8'),
+])
+EWKB_POINT_WITH_SRID = 0x20000001
+SRID = 4326
+
+def ewkb_points(lng, lat):
+    """批量构造 SRID=4326 的 EWKB 点，返回 EWKB_POINT_DTYPE 结构化数组"""
+    points = np.empty(len(lng), dtype=EWKB_POINT_DTYPE)
+    points['byte_order'] = 1
+    points['type'] = EWKB_POINT_WITH_SRID
+    points['srid'] = SRID
+    points['x'] = lng
+    points['y'] = lat
+    return points
+
+# .tbl 文本行中 dtg 的固定格式 '%Y-%m-%d %H:%M:%S' (19 字节)
+DTG_TEXT_LEN = 19
+DTG_MINUTE_PREFIX_LEN = 17  # 'YYYY-MM-DD HH:MM:'
+MINUTES_PER_DAY = 1440
+# 并行填充时每个线程任务处理的行数, 块内可复用上一行的日期时间前缀
+FILL_BLOCK_ROWS = 1 << 14
+
+@njit(inline='always')
+def _write_digits(row, pos, value, width):
+    """将非负整数 value 以 width 位十进制 (左侧补零) 写入 row[pos:pos + width]"""
+    for k in range(width - 1, -1, -1):
+        row[pos + k] = 48 + value % 10
+        value //= 10
+    return pos + width
+
+@njit(inline='always')
+def _write_hex(row, pos, raw):
+    """将 raw 中的字节按小写十六进制写入 row，返回写入后的位置"""
+    for k in range(raw.shape[0]):
+        row[pos] = HEX_DIGITS[raw[k] >> 4]
+        row[pos + 1] = HEX_DIGITS[raw[k] & 0x0f]
+        pos += 2
+    return pos
+
+@njit(parallel=True, cache=True)
+def _fill_tbl_lines(lines, fid_raw, geom_raw, dtg_seconds, taxi_bytes):
+    """
+    并行逐行填充 .tbl 行缓冲区: fid(带 '-' 的 UUID 文本)|geom(十六进制 EWKB)|dtg|taxi_id\n。
+    行按 FILL_BLOCK_ROWS 分块并行; 块内顺序处理并缓存上一行的 'YYYY-MM-DD HH:MM:' 前缀,
+    出租车轨迹按时间排序, 同一分钟内的行只需补写秒数, 不必再走公历换算 (civil_from_days)。
+    """
+    n = lines.shape[0]
+    for block in prange((n + FILL_BLOCK_ROWS - 1) // FILL_BLOCK_ROWS):
+        minute_prefix = np.empty(DTG_MINUTE_PREFIX_LEN, dtype=np.uint8)
+        last_minute = -(1 << 62)
+        for i in range(block * FILL_BLOCK_ROWS, min(n, (block + 1) * FILL_BLOCK_ROWS)):
+            row = lines[i]
+
+            pos = _write_hex(row, 0, fid_raw[i, 0:4])
+            for start, end in ((4, 6), (6, 8), (8, 10), (10, 16)):
+                row[pos] = 45  # '-'
+                pos = _write_hex(row, pos + 1, fid_raw[i, start:end])
+            row[pos] = 124  # '|'
+
+            pos = _write_hex(row, pos + 1, geom_raw[i])
+            row[pos] = 124
+            pos += 1
+
+            minute = dtg_seconds[i] // 60
+            if minute != last_minute:
+                last_minute = minute
+                days = minute // MINUTES_PER_DAY
+                minute_of_day = minute - days * MINUTES_PER_DAY
+                z = days + 719468
+                era = z // 146097
+                doe = z - era * 146097
+                yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+                doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+                mp = (5 * doy + 2) // 153
+                day = doy - (153 * mp + 2) // 5 + 1
+                month = mp + 3 if mp < 10 else mp - 9
+                year = yoe + era * 400 + (1 if month <= 2 else 0)
+
+                k = _write_digits(minute_prefix, 0, year, 4)
+                minute_prefix[k] = 45
+                k = _write_digits(minute_prefix, k + 1, month, 2)
+                minute_prefix[k] = 45
+                k = _write_digits(minute_prefix, k + 1, day, 2)
+                minute_prefix[k] = 32  # ' '
+                k = _write_digits(minute_prefix, k + 1, minute_of_day // 60, 2)
+                minute_prefix[k] = 58  # ':'
+                k = _write_digits(minute_prefix, k + 1, minute_of_day % 60, 2)
+                minute_prefix[k] = 58
+
+            row[pos:pos + DTG_MINUTE_PREFIX_LEN] = minute_prefix
+            pos = _write_digits(row, pos + DTG_MINUTE_PREFIX_LEN, dtg_seconds[i] - minute * 60, 2)
+            row[pos] = 124
+
+            pos += 1
+            for k in range(taxi_bytes.shape[0]):
+                row[pos + k] = taxi_bytes[k]
+            row[pos + taxi_bytes.shape[0]] = 10  # '\n'
+
+
+def build_tbl_lines(fid_raw, points, dtg_seconds, taxi_bytes):
+    """
+    拼出全部 .tbl 行，返回形状为 (n, 行宽) 的 uint8 数组。
+    fid/geom/dtg 均为定长文本，taxi_id 在同一文件内不变，因此每行等宽，
+    由 Numba 编译的并行内核一次写完，不经过任何逐行 Python 代码。
+    """
+    taxi = np.frombuffer(taxi_bytes, dtype=np.uint8)
+    line_width = UUID_TEXT_LEN + 2 * EWKB_POINT_DTYPE.itemsize + DTG_TEXT_LEN + len(taxi) + 4
+    lines = np.empty((len(fid_raw), line_width), dtype=np.uint8)
+    geom_raw = points.view(np.uint8).reshape(len(points), EWKB_POINT_DTYPE.itemsize)
+    _fill_tbl_lines(lines, fid_raw, geom_raw, dtg_seconds, taxi)
+    return lines
+
+# PostgreSQL timestamp 的二进制表示为 2000-01-01 起的微秒数
+PG_EPOCH_OFFSET_SECONDS = 946684800
+
+# 一行 (fid, geom, dtg, taxi_id) 的二进制 COPY 记录，所有字段定长，整体 91 字节
+TBLBIN_ROW_DTYPE = np.dtype([
+    ('field_count', '>i2'),
+    ('fid_len', '>i4'), ('fid', f'S{UUID_TEXT_LEN}'),
+    ('geom_len', '>i4'), ('geom', EWKB_POINT_DTYPE),
+    ('dtg_len', '>i4'), ('dtg', '>i8'),
+    ('taxi_id_len', '>i4'), ('taxi_id', '>i4'),
+])
+
+def write_row_count(data_path, line_count):
+    """在数据文件旁写出记录其行数的 .rows 文件"""
+    with open(data_path + ROWS_SUFFIX, mode='w', encoding='utf-8') as rows_file:
+        rows_file.write(str(line_count))
+
+def write_tblbin(tbl_path, fid_bytes, points, dtg_seconds, taxi_id):
+    """
+    将一个文件的全部行按 PostgreSQL 二进制 COPY 格式写出 (.tblbin)。
+    geom 直接写成 EWKB，dtg 写成微秒整数，导入时服务端无需再解析 WKT 和时间文本。
+    """
+    rows = np.empty(len(points), dtype=TBLBIN_ROW_DTYPE)
+    rows['field_count'] = 4
+    rows['fid_len'] = UUID_TEXT_LEN
+    rows['fid'] = fid_bytes.view(f'S{UUID_TEXT_LEN}').ravel()
+    rows['geom_len'] = EWKB_POINT_DTYPE.itemsize
+    rows['geom'] = points
+    rows['dtg_len'] = 8
+    rows['dtg'] = (dtg_seconds - PG_EPOCH_OFFSET_SECONDS) * 1_000_000
+    rows['taxi_id_len'] = 4
+    rows['taxi_id'] = taxi_id
+
+    with open(tbl_path, mode='wb') as outfile:
+        outfile.write(PGCOPY_HEADER)
+        outfile.write(rows.tobytes())
+        outfile.write(PGCOPY_TRAILER)
+
+def parse_dtg_column(column):
+    """
+    将时间文本列转换为秒级时间戳，无法解析的值 (包括空值) 转为 null。
+    整列合法时直接用 Arrow 的 ISO8601 转换；否则改用 strptime 逐值解析，
+    并把结果格式化回文本与原值比对，剔除 strptime 会自动进位的非法时间 (如 02-30、秒数 60)。
+    """
+    try:
+        return column.cast(pa.timestamp('s'))
+    except pa.ArrowInvalid:
+        parsed = pc.strptime(column, format=DTG_FORMAT, unit='s', error_is_null=True)
+        return pc.if_else(pc.equal(pc.strftime(parsed, format=DTG_FORMAT), column), parsed, pa.scalar(None, parsed.type))
+
+def parse_float_column(column):
+    """将经纬度文本列转换为 float64，无法解析的值 (包括空值) 转为 null"""
+    # 与 float() 一致，容忍首尾空白 (如 " 116.3")
+    column = pc.utf8_trim_whitespace(column)
+    try:
+        return column.cast(pa.float64())
+    except pa.ArrowInvalid:
+        valid = pc.match_substring_regex(column, FLOAT_TEXT_PATTERN)
+        return pc.if_else(valid, column, pa.scalar(None, pa.string())).cast(pa.float64())
+
+def generate_tbl_from_csv_folder(input_folder, binary=False, compress=False):
     """
     读取一个文件夹中的所有CSV文件，将每一行转换为.tbl格式的行，
     并使用制表符分隔，然后将结果保存到同级的_tbl文件夹中。
 
     :param input_folder: 包含CSV文件的输入文件夹路径。
+    :param binary: 为 True 时输出 PostgreSQL 二进制 COPY 格式的 .tblbin 文件。
+    :param compress: 为 True 时输出 zstd 压缩的 .tbl.zst 文件 (仅文本格式)，导入时流式解压，减少磁盘读取量。
     """
+    if binary and compress:
+        print("错误：压缩输出仅支持文本 .tbl 格式。")
+        return
+
     if not os.path.isdir(input_folder):
         print(f"错误：输入目录 '{input_folder}' 不存在或不是一个目录。")
         return
@@ -35,27 +265,38 @@ def generate_tbl_from_csv_folder(input_folder):
 
     print(f"共找到 {total_files} 个CSV文件需要处理。")
 
-    for i, filename in enumerate(csv_files, start=1):
-        input_file_path = os.path.join(input_folder, filename)
+    # 每个CSV文件的转换互不依赖且为纯CPU计算，分发到多进程并行处理以绕开GIL
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {}
+        for filename in csv_files:
+            input_file_path = os.path.join(input_folder, filename)
 
-        # 将输出文件的扩展名改为 .tbl
-        output_filename = os.path.splitext(filename)[0] + '.tbl'
-        output_file_path = os.path.join(output_folder, output_filename)
+            # 将输出文件的扩展名改为 .tbl (二进制格式为 .tblbin，压缩格式为 .tbl.zst)
+            output_filename = os.path.splitext(filename)[0] + ('.tblbin' if binary else '.tbl')
+            if compress:
+                output_filename += '.zst'
+            output_file_path = os.path.join(output_folder, output_filename)
 
-        print(f"\n[进度: {i}/{total_files}] 正在处理文件: '{filename}' ...")
+            future = executor.submit(process_single_csv_to_tbl, input_file_path, output_file_path, binary, compress)
+            futures[future] = filename
 
-        try:
-            process_single_csv_to_tbl(input_file_path, output_file_path)
-        except Exception as e:
-            print(f"  处理文件 '{filename}' 时发生未知错误: {e}")
+        for i, future in enumerate(as_completed(futures), start=1):
+            filename = futures[future]
+            print(f"\n[进度: {i}/{total_files}] 已处理文件: '{filename}'")
+
+            try:
+                future.result()
+            except Exception as e:
+                print(f"  处理文件 '{filename}' 时发生未知错误: {e}")
 
     print("\n所有文件处理完毕！")
 
-def process_single_csv_to_tbl(csv_path, tbl_path):
+def process_single_csv_to_tbl(csv_path, tbl_path, binary=False, compress=False):
     """
-    处理单个CSV文件，生成对应的.tbl文件。
+    处理单个CSV文件，生成对应的.tbl文件 (binary 为 True 时生成 .tblbin 文件，compress 为 True 时整体 zstd 压缩)。
+    使用 PyArrow 的 C++ CSV 读取器按列解析，并用 Arrow 计算内核向量化地生成各列，
+    不再逐行调用 csv.reader / datetime.strptime / float。
     """
-    line_count = 0
     # 从文件名中提取 taxi_id
     try:
         taxi_id = int(os.path.basename(csv_path).split('.')[0])
@@ -63,51 +304,76 @@ def process_single_csv_to_tbl(csv_path, tbl_path):
         print(f"  警告: 无法从文件名 '{os.path.basename(csv_path)}' 中解析 taxi_id，将跳过此文件。")
         return
 
-    with open(csv_path, mode='r', encoding='utf-8') as infile, \
-            open(tbl_path, mode='w', encoding='utf-8', newline='') as outfile:
-
-        csv_reader = csv.reader(infile, delimiter=',')
-        # 使用'|'作为.tbl文件的分隔符
-        tbl_writer = csv.writer(outfile, delimiter='|', quoting=csv.QUOTE_NONE, escapechar='\\')
-
-        try:
-            # 读取并跳过表头
-            header = next(csv_reader)
-            expected_header = ['dtg_str', 'lat', 'lng', 'speed', 'geohash']
-            if header != expected_header:
-                print(f"  警告: 文件 '{os.path.basename(csv_path)}' 的表头与预期不符。当前表头: {header}")
-        except StopIteration:
-            print(f"  警告: 文件 '{os.path.basename(csv_path)}' 是空的。")
-            return
-
-        # 逐行处理数据
-        for j, row in enumerate(csv_reader, start=1):
-            try:
-                dtg_str = row[0]
-                lat_str = row[1]
-                lng_str = row[2]
+    # 读取并检查表头 (数据列按位置解析，表头不符时仅告警)
+    with open(csv_path, mode='r', encoding='utf-8') as infile:
+        header = infile.readline().rstrip('\r\n').split(',')
+    if header == ['']:
+        print(f"  警告: 文件 '{os.path.basename(csv_path)}' 是空的。")
+        return
+    if header != EXPECTED_HEADER:
+        print(f"  警告: 文件 '{os.path.basename(csv_path)}' 的表头与预期不符。当前表头: {header}")
+
+    # 格式错误的行只记录下来，读取结束后每个文件汇总输出一次
+    invalid_rows = []
 
-                # 确保日期时间字符串格式正确
-                dtg = datetime.strptime(dtg_str, '%Y-%m-%d %H:%M:%S')
+    def skip_invalid_row(row):
+        invalid_rows.append(row.text)
+        return 'skip'
 
-                lat = float(lat_str)
-                lng = float(lng_str)
+    # 三列先按文本读入，再分别转换: 若直接指定列类型，任一值无法解析都会使整个文件读取失败
+    with pa.input_stream(csv_path, buffer_size=IO_BUFFER_SIZE) as source:
+        table = pa_csv.read_csv(
+            source,
+            read_options=pa_csv.ReadOptions(column_names=EXPECTED_HEADER, skip_rows=1, block_size=IO_BUFFER_SIZE),
+            # 数据中没有引号、转义符和跨行字段，关闭相关处理以走 Arrow 最快的分词路径
+            parse_options=pa_csv.ParseOptions(
+                delimiter=',',
+                quote_char=False,
+                double_quote=False,
+                escape_char=False,
+                newlines_in_values=False,
+                invalid_row_handler=skip_invalid_row
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=['dtg_str', 'lat', 'lng'],
+                column_types={'dtg_str': pa.string(), 'lat': pa.string(), 'lng': pa.string()}
+            )
+        )
+    table = pa.table({
+        'dtg_str': parse_dtg_column(table['dtg_str']),
+        'lat': parse_float_column(table['lat']),
+        'lng': parse_float_column(table['lng']),
+    })
 
-                geom_wkt = f"SRID=4326;POINT({lng} {lat})"
+    if invalid_rows:
+        print(f"  跳过 {len(invalid_rows)} 行，因为格式错误 (首行: {invalid_rows[0]})")
 
-                # <-- 新增：为每一行生成一个唯一的UUID作为Feature ID
-                feature_id = uuid.uuid4()
+    # 与逐行解析时一致：时间或经纬度为空、无法解析的行视为格式错误并跳过
+    valid_table = table.drop_null()
+    if valid_table.num_rows < table.num_rows:
+        print(f"  跳过 {table.num_rows - valid_table.num_rows} 行，因为时间或经纬度为空或格式错误。")
+    table = valid_table
+    line_count = table.num_rows
 
-                # <-- 修改：按照 (fid, geom, dtg, taxi_id) 的顺序组织数据
-                # 将 feature_id 转换为字符串并放在最前面
-                tbl_row = [str(feature_id), geom_wkt, dtg, taxi_id]
+    # 为每一行生成一个唯一的UUID作为Feature ID
+    fid_raw = random_uuid_raw(line_count)
+    points = ewkb_points(table['lng'].to_numpy(), table['lat'].to_numpy())
+    dtg_seconds = table['dtg_str'].cast(pa.int64()).to_numpy()
 
-                # 将处理好的行写入.tbl文件
-                tbl_writer.writerow(tbl_row)
-                line_count += 1
+    if binary:
+        write_tblbin(tbl_path, uuid_text_bytes(fid_raw), points, dtg_seconds, taxi_id)
+        write_row_count(tbl_path, line_count)
+        print(f"  处理完成，成功生成 {line_count} 行数据到 '{os.path.basename(tbl_path)}'。")
+        return
 
-            except (ValueError, IndexError) as e:
-                print(f"  [行号: {j+1}] 跳过该行，因为格式错误: {row} -> 错误: {e}")
+    # geom 写成十六进制 EWKB 文本 (PostGIS geometry 的标准文本输入之一)：
+    # 既不逐行拼接 WKT 字符串，导入时服务端也无需词法解析 WKT。
+    # (同样读取 .tbl 的 Java 导入测试 IngestDataTest/IngestDataSshTest 兼容十六进制 EWKB 与旧版 WKT 两种格式)
+    # 按照 (fid, geom, dtg, taxi_id) 的顺序组织数据，使用'|'作为.tbl文件的分隔符，一次写出整个文件
+    lines = build_tbl_lines(fid_raw, points, dtg_seconds, str(taxi_id).encode('ascii'))
+    with open(tbl_path, mode='wb', buffering=IO_BUFFER_SIZE) as outfile:
+        outfile.write(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(lines.data) if compress else lines.data)
+    write_row_count(tbl_path, line_count)
 
     print(f"  处理完成，成功生成 {line_count} 行数据到 '{os.path.basename(tbl_path)}'。")
 
@@ -1,12 +1,23 @@
 #!/usr/bin/env python3
+import argparse
+import functools
 import os
 import sys
 import time
 import logging
-import subprocess
-import shlex
+import logging.handlers
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import psycopg
+from psycopg import sql
+from psycopg_pool import ConnectionPool
+import zstandard
+
+from tbl_format import IO_BUFFER_SIZE, PGCOPY_HEADER, PGCOPY_TRAILER, ROWS_SUFFIX
+
 # ==================== 日志配置 ====================
 SCRIPT_DIR = Path(__file__).parent.resolve()
 LOG_DIR = SCRIPT_DIR.parent / "logs"
@@ -14,244 +25,787 @@ LOG_DIR.mkdir(exist_ok=True)
 
 LOG_FILE = LOG_DIR / f"import_log_{time.strftime('%Y%m%d')}.log"
 
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+# 日志文件经 MemoryHandler 缓冲: 攒满 LOG_BUFFER_RECORDS 条、出现 WARNING 及以上级别或进程退出时才批量写盘
+LOG_BUFFER_RECORDS = 1000
+
+file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
+file_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFMT))
+
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
+    format=LOG_FORMAT,
+    datefmt=LOG_DATEFMT,
     handlers=[
-        logging.FileHandler(LOG_FILE, encoding="utf-8"),
+        logging.handlers.MemoryHandler(LOG_BUFFER_RECORDS, flushLevel=logging.WARNING, target=file_handler),
         logging.StreamHandler(sys.stdout)
     ]
 )
 
 # ==================== 配置参数 ====================
-CONTAINER_NAME = "my-postgis-container"
+# my-postgis-container 映射到宿主机的端口
+DB_HOST = "localhost"
+DB_PORT = 5432
 DB_USER = "postgres"
+# 密码不写在脚本中: libpq/asyncpg 会自动读取环境变量 PGPASSWORD 或 ~/.pgpass
 DB_NAME = "postgres"
 TARGET_TABLE_BASE = "performance"
 TBL_DIR_IN_LOCAL = Path("/data6/zhangdw/datasets/beijingshi_tbl_100k")
-ROWS_PER_FILE = 100000
+# 后台读线程最多预读的块数
+READ_AHEAD_CHUNKS = 4
+# 按扩展名选择 COPY 格式 (WITH 括号内的选项): .tbl 为 '|' 分隔文本，.tblbin 为 csv_to_tbl_converter 生成的二进制 COPY 文件
+COPY_OPTIONS_BY_SUFFIX = {
+    ".tbl": sql.SQL("FORMAT text, DELIMITER E'|', NULL E''"),
+    ".tblbin": sql.SQL("FORMAT binary"),
+}
+# csv_to_tbl_converter 以 compress=True 生成的 zstd 压缩文本文件 (.tbl.zst)，导入时流式解压后按 .tbl 格式 COPY
+ZSTD_SUFFIX = ".zst"
+# 每次 COPY 合并导入的文件数，摊薄每条 COPY 语句及事务提交的固定开销
+BATCH_FILES = 16
+# 暂存导入模式: 先 COPY 到无索引的 UNLOGGED 暂存表 (不写 WAL)，全部完成后一次性 INSERT ... SELECT 到目标分区
+USE_STAGING_TABLE = False
+STAGING_TABLE = "perf_stage"
+# 免日志导入模式: 导入期间将目标分区设为 UNLOGGED 并关闭 autovacuum，连接使用 synchronous_commit=off，
+# 导入结束后恢复 LOGGED (此时整表写入一次 WAL) 和 autovacuum。导入中途数据库崩溃会清空该分区，需重新全量导入
+UNLOGGED_LOAD = False
+# 数据目录在数据库容器内的挂载路径 (如 "/tbldata")。设置后改用服务端 COPY ... FROM '文件路径'，
+# 由 PostgreSQL 直接顺序读取文件，数据不再经客户端中转; 需要 superuser 或 pg_read_server_files 权限。
+# .tbl.zst 文件需要客户端解压，仍走 FROM STDIN
+SERVER_TBL_DIR = None
+# 冻结导入模式: 在同一个事务中先 TRUNCATE 写入分区，再逐批 COPY ... FREEZE，写入的元组直接标记为已冻结，
+# 之后不再需要 VACUUM FREEZE 及首次读取时回写提示位。代价是所有批次在一个连接上串行执行，
+# 任一批失败则整个事务回滚；事务期间分区持有 ACCESS EXCLUSIVE 锁。开启后忽略 USE_STAGING_TABLE
+FREEZE_LOAD = False
+# GeoMesa 为要素类型创建的数据父表后缀 (写前日志表、近期分区、主分区、溢出表)，数据都在其继承子表中
+FEATURE_TABLE_SUFFIXES = ["_wa", "_wa_partition", "_partition", "_spill"]
+# 待清空的表少于该数量时用一条 TRUNCATE 语句清空，不值得并发
+PARALLEL_TRUNCATE_MIN_TABLES = 4
+# 各批次的成功明细只以 DEBUG 级别输出，INFO 级别每完成这么多批汇总一次进度
+PROGRESS_LOG_BATCHES = 10
+# 并发 COPY 的线程数 (每个线程占用连接池中的一个连接)，需按机器核数/磁盘带宽实测调整
+MAX_WORKERS = 8
 
 # ==================== 工具函数 ====================
-def run_command(cmd, check=True, capture_output=False):
-    """执行简单 shell 命令"""
+def create_pool():
+    """创建到 PostGIS 的连接池，导入线程各自复用池中的长连接"""
+    kwargs = {
+        "host": DB_HOST,
+        "port": DB_PORT,
+        "dbname": DB_NAME,
+        "user": DB_USER,
+        "autocommit": True,
+    }
+    if UNLOGGED_LOAD:
+        # 提交时不等待 WAL 刷盘
+        kwargs["options"] = "-c synchronous_commit=off"
+    return ConnectionPool(
+        kwargs=kwargs,
+        min_size=MAX_WORKERS,
+        max_size=MAX_WORKERS * 2,
+        open=False
+    )
+
+def copy_format(file_path):
+    """返回文件对应的 COPY 格式扩展名 (.tbl.zst 按 .tbl 处理)，不是数据文件时返回 None"""
+    if file_path.name.endswith(".tbl" + ZSTD_SUFFIX):
+        return ".tbl"
+    return file_path.suffix if file_path.suffix in COPY_OPTIONS_BY_SUFFIX else None
+
+
+def read_chunks_in_background(file_path, start=0, end=None):
+    """
+    由后台线程顺序读取文件 [start, end) 范围的字节并放入有界队列，调用方边取边发送，
+    使磁盘读取与向数据库发送数据的耗时相互重叠。.zst 文件在读线程中流式解压，产出解压后的数据。
+    """
+    chunks = queue.Queue(maxsize=READ_AHEAD_CHUNKS)
+    stop = threading.Event()
+
+    def reader():
+        try:
+            with open(file_path, 'rb', buffering=IO_BUFFER_SIZE) as f:
+                # 提示内核按顺序预读
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                if file_path.suffix == ZSTD_SUFFIX:
+                    f = zstandard.ZstdDecompressor().stream_reader(f, read_size=IO_BUFFER_SIZE)
+                f.seek(start)
+                remaining = end - start if end is not None else None
+                while not stop.is_set() and remaining != 0:
+                    size = IO_BUFFER_SIZE if remaining is None else min(IO_BUFFER_SIZE, remaining)
+                    if not (chunk := f.read(size)):
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    chunks.put(chunk)
+        except BaseException as e:
+            # 任何异常 (不只是读取/解压错误) 都要交给调用方，否则调用方会在 chunks.get() 上永远阻塞
+            chunks.put(e)
+            return
+        chunks.put(None)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
     try:
-        result = subprocess.run(
-            cmd,
-            shell=True,
-            check=check,
-            capture_output=capture_output,
-            text=True
-        )
-        return result
-    except subprocess.CalledProcessError as e:
-        logging.error(f"命令执行失败: {e.cmd}")
-        if capture_output and e.stderr:
-            logging.error(f"错误输出: {e.stderr.strip()}")
-        raise e
+        while (chunk := chunks.get()) is not None:
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+    finally:
+        # 调用方提前退出 (如 COPY 失败) 时通知读线程停止，并取空队列解除其阻塞
+        stop.set()
+        while thread.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
 
 # ==================== 核心导入函数 ====================
-def import_single_file_with_lock(file_path):
+def expected_row_count(file_paths):
+    """累加各数据文件旁 .rows 文件记录的行数；任一文件缺少行数文件时返回 None"""
+    total = 0
+    for fp in file_paths:
+        try:
+            total += int(Path(f"{fp}{ROWS_SUFFIX}").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+    return total
+
+
+def public_table(table_name):
+    """返回 public 模式下表名的 SQL 标识符 (自动加引号转义)"""
+    return sql.Identifier("public", table_name)
+
+
+def resolve_partition_name(pool):
     """
-    使用 Python Popen 流式传输数据，精确控制换行符，避免 'literal newline' 错误。
+    查询 geomesa_wa_seq，返回当前活动的写入分区表名 (不带引号，拼入 SQL 时使用 sql.Identifier)。
     """
-
-    # --- 步骤 1: 获取动态分区表名 ---
     get_partition_sql = (
-        f"SELECT '\"{TARGET_TABLE_BASE}_wa_' || lpad(value::text, 3, '0') || '\"' "
-        f"FROM \"public\".\"geomesa_wa_seq\" WHERE type_name = '{TARGET_TABLE_BASE}'"
+        "SELECT %s || '_wa_' || lpad(value::text, 3, '0') "
+        "FROM \"public\".\"geomesa_wa_seq\" WHERE type_name = %s"
     )
 
-    get_partition_cmd = (
-        f"docker exec {CONTAINER_NAME} "
-        f"psql -U {DB_USER} -d {DB_NAME} -tA -c {shlex.quote(get_partition_sql)}"
+    with pool.connection() as conn:
+        row = conn.execute(get_partition_sql, (TARGET_TABLE_BASE, TARGET_TABLE_BASE)).fetchone()
+    partition_name = row[0] if row else None
+    if not partition_name:
+        raise ValueError("未能从 geomesa_wa_seq 获取分区名")
+    return partition_name
+
+
+class ActivePartition:
+    """
+    导入线程共享的当前写入分区名，整个导入通常只查询一次 geomesa_wa_seq。
+    若导入期间 GeoMesa 的 pg_cron 任务滚动了写入分区 (旧分区被删除，COPY 报 UndefinedTable)，
+    由第一个遇到错误的线程重新查询，其余线程直接使用新的分区名。
+    """
+
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+        self.lock = threading.Lock()
+
+    def refresh(self, stale_name):
+        """stale_name 已失效时重新查询并返回当前分区名 (其他线程已刷新过则直接返回)"""
+        with self.lock:
+            if self.name == stale_name:
+                self.name = resolve_partition_name(self.pool)
+            return self.name
+
+
+def set_partition_logged(pool, partition_name, logged):
+    """切换目标分区的 LOGGED/UNLOGGED 状态，UNLOGGED 期间同时关闭该表的 autovacuum"""
+    table = public_table(partition_name)
+    with pool.connection() as conn:
+        with conn.pipeline(), conn.transaction():
+            if logged:
+                conn.execute(sql.SQL("ALTER TABLE {} SET LOGGED").format(table))
+                conn.execute(sql.SQL("ALTER TABLE {} RESET (autovacuum_enabled)").format(table))
+            else:
+                conn.execute(sql.SQL("ALTER TABLE {} SET (autovacuum_enabled = false)").format(table))
+                conn.execute(sql.SQL("ALTER TABLE {} SET UNLOGGED").format(table))
+
+
+def drop_secondary_indexes(pool, partition_name):
+    """
+    删除目标分区上不承载约束的二级索引 (geom 的 GiST、dtg/taxi_id 的 B-Tree 等，主键保留)，
+    返回这些索引的 CREATE INDEX 定义，导入完成后据此统一重建。
+    """
+    get_indexes_sql = (
+        "SELECT pg_get_indexdef(i.indexrelid), ic.relname "
+        "FROM pg_index i JOIN pg_class ic ON ic.oid = i.indexrelid "
+        "WHERE i.indrelid = %s::regclass "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)"
     )
+    with pool.connection() as conn:
+        with conn.transaction():
+            rows = conn.execute(get_indexes_sql, (public_table(partition_name).as_string(conn),)).fetchall()
+            for _, index_name in rows:
+                conn.execute(sql.SQL("DROP INDEX {}").format(public_table(index_name)))
+    return [index_def for index_def, _ in rows]
 
-    try:
-        result = run_command(get_partition_cmd, capture_output=True)
-        partition_name = result.stdout.strip()
-        if not partition_name:
-            raise ValueError(f"未能从 geomesa_wa_seq 获取分区名")
-        logging.info(f"      -> 动态获取分区表名: {partition_name}")
-    except Exception as e:
-        logging.error(f"      -> 获取分区表名失败: {e}")
-        if hasattr(e, 'stderr') and e.stderr: logging.error(f"      -> details: {e.stderr.strip()}")
-        return subprocess.CompletedProcess(args=get_partition_cmd, returncode=1, stderr=str(e))
-
-    # --- 步骤 2: 使用 Popen 进行精确的数据管道传输 ---
-
-    lock_table_name = f'"{TARGET_TABLE_BASE}_wa"'
-    copy_options = "WITH (FORMAT text, DELIMITER E'|', NULL E'')"
-    copy_sql = f"COPY public.{partition_name}(fid,geom,dtg,taxi_id) FROM STDIN {copy_options};"
-
-    # 1. 准备 SQL 头部
-    sql_header = (
-        f"BEGIN;\n"
-        f"LOCK TABLE public.{lock_table_name} IN SHARE UPDATE EXCLUSIVE MODE;\n"
-        f"{copy_sql}\n"
-    ).encode('utf-8')
-
-    # 2. 准备 SQL 尾部
-    sql_footer = b"\\.\nCOMMIT;\n"
-
-    # 3. 启动 psql 进程
-    psql_cmd = f"docker exec -i {CONTAINER_NAME} psql -U {DB_USER} -d {DB_NAME} -q -v ON_ERROR_STOP=1"
-
-    proc = None
-    try:
-        proc = subprocess.Popen(
-            psql_cmd,
-            shell=True,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+
+def feature_tables_sql():
+    """
+    返回列出 GeoMesa 各数据父表及其所有 (多级) 继承子表中普通表的查询，结果形如 [(模式名, 表名), ...]。
+    参数已内联为字面量，asyncpg 版本也可以直接执行。
+    """
+    return sql.SQL("""
+        WITH RECURSIVE tree(relid) AS (
+            SELECT to_regclass(format('public.%I', {} || suffix))
+            FROM unnest({}::text[]) AS suffix
+            UNION ALL
+            SELECT i.inhrelid FROM pg_inherits i JOIN tree t ON i.inhparent = t.relid
         )
+        SELECT n.nspname, c.relname
+        FROM tree t
+        JOIN pg_class c ON c.oid = t.relid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind = 'r'
+    """).format(sql.Literal(TARGET_TABLE_BASE), sql.Literal(FEATURE_TABLE_SUFFIXES)).as_string(None)
+
+
+def truncate_statements(tables):
+    """
+    为 [(模式名, 表名), ...] 生成 TRUNCATE ONLY 语句: 表少于 PARALLEL_TRUNCATE_MIN_TABLES 张时合并为一条，
+    否则每张表一条，由调用方在多个连接上并发执行。
+    """
+    identifiers = [sql.Identifier(schema, name) for schema, name in tables]
+    if len(identifiers) < PARALLEL_TRUNCATE_MIN_TABLES:
+        identifiers = [sql.SQL(", ").join(identifiers)] if identifiers else []
+    return [sql.SQL("TRUNCATE ONLY {}").format(identifier).as_string(None) for identifier in identifiers]
+
+
+def delete_all_sql():
+    """未找到 GeoMesa 的数据表结构时的退路: 通过主表/视图逐行删除"""
+    return sql.SQL("DELETE FROM {}").format(sql.Identifier(TARGET_TABLE_BASE)).as_string(None)
+
+
+def list_feature_tables(pool):
+    """返回 GeoMesa 各数据父表及其所有 (多级) 继承子表中的普通表，形如 [(模式名, 表名), ...]"""
+    with pool.connection() as conn:
+        return conn.execute(feature_tables_sql()).fetchall()
+
+
+def truncate_feature_tables(pool):
+    """
+    用 TRUNCATE 清空 GeoMesa 的全部数据表，返回清空的表数 (未找到任何表时为 0)。
+    TRUNCATE 直接换掉数据文件，不像 DELETE 那样逐行删除、写 WAL 并留下死元组；
+    表较多时对每张表单独 TRUNCATE ONLY，在连接池的多个连接上并发执行，而不是在一条语句中串行处理所有子表。
+    """
+    tables = list_feature_tables(pool)
+    statements = truncate_statements(tables)
+
+    def truncate(statement):
+        with pool.connection() as conn:
+            conn.execute(statement)
+
+    if len(statements) <= 1:
+        for statement in statements:
+            truncate(statement)
+        return len(tables)
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(statements))) as executor:
+        for fut in as_completed([executor.submit(truncate, statement) for statement in statements]):
+            fut.result()
+    return len(tables)
+
+
+def recreate_indexes(pool, index_defs):
+    """用连接池中的多个连接并发重建索引，返回失败的 (索引定义, 异常) 列表"""
+    def create_index(index_def):
+        with pool.connection() as conn:
+            conn.execute(index_def)
+
+    failures = []
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(index_defs))) as executor:
+        futures = {executor.submit(create_index, index_def): index_def for index_def in index_defs}
+        for fut in as_completed(futures):
+            try:
+                fut.result()
+            except psycopg.Error as e:
+                failures.append((futures[fut], e))
+    return failures
+
+
+def create_staging_table(pool, partition_name):
+    """以目标分区为模板重建 UNLOGGED 暂存表 (只复制列和默认值，不带索引)，返回暂存表名"""
+    # pipeline 模式下各语句连续发送，只在事务结束时等待一次服务端响应
+    with pool.connection() as conn:
+        with conn.pipeline(), conn.transaction():
+            conn.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(public_table(STAGING_TABLE)))
+            conn.execute(
+                sql.SQL("CREATE UNLOGGED TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(
+                    public_table(STAGING_TABLE), public_table(partition_name)
+                )
+            )
+    return STAGING_TABLE
+
+
+def flush_staging_table(pool, staging_table, partition_name):
+    """将暂存表中的数据一次性写入目标分区并删除暂存表，返回写入行数"""
+    with pool.connection() as conn:
+        with conn.pipeline(), conn.transaction():
+            conn.execute("SET LOCAL synchronous_commit = off")
+            cur = conn.execute(
+                sql.SQL("INSERT INTO {} (fid,geom,dtg,taxi_id) SELECT fid,geom,dtg,taxi_id FROM {}").format(
+                    public_table(partition_name), public_table(staging_table)
+                )
+            )
+            conn.execute(sql.SQL("DROP TABLE {}").format(public_table(staging_table)))
+        # pipeline 退出时才同步取回结果，之后 rowcount 才可用
+        return cur.rowcount
+
+
+def iter_batch_chunks(file_paths):
+    """
+    依次生成一批文件的数据块，拼接成单条 COPY 的输入流。
+    文本文件之间确保以换行分隔；二进制文件去掉各自的头和结尾标记，整批只写一份。
+    """
+    if copy_format(file_paths[0]) == ".tblbin":
+        yield PGCOPY_HEADER
+        for file_path in file_paths:
+            with open(file_path, 'rb') as f:
+                if f.read(len(PGCOPY_HEADER)) != PGCOPY_HEADER:
+                    raise ValueError(f"{file_path.name} 不是预期的二进制 COPY 文件")
+            body_end = file_path.stat().st_size - len(PGCOPY_TRAILER)
+            yield from read_chunks_in_background(file_path, len(PGCOPY_HEADER), body_end)
+        yield PGCOPY_TRAILER
+        return
+
+    for file_path in file_paths:
+        # 读线程不会产出空块，只需记住最后一块的末字节 (空文件保持为 b'\n'，不补换行)
+        last_byte = b'\n'
+        for chunk in read_chunks_in_background(file_path):
+            yield chunk
+            last_byte = chunk[-1:]
+        if last_byte != b'\n':
+            yield b'\n'
+
+
+def build_copy_sql(target_table, suffix, server_path=None, freeze=False):
+    """
+    组装指定格式文件写入目标表的 COPY 语句，默认 FROM STDIN，给出 server_path 时由服务端读取该文件。
+    freeze=True 时附加 FREEZE 选项，要求目标表在当前事务中被创建或 TRUNCATE 过。
+    """
+    source = sql.SQL("STDIN") if server_path is None else sql.Literal(server_path)
+    options = COPY_OPTIONS_BY_SUFFIX[suffix]
+    if freeze:
+        options = sql.SQL("{}, FREEZE").format(options)
+    return sql.SQL("COPY {} (fid,geom,dtg,taxi_id) FROM {} WITH ({})").format(
+        public_table(target_table), source, options
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def copy_from_stdin_sql(target_table, suffix, freeze=False):
+    """按 (目标表, 格式, 是否 FREEZE) 缓存 COPY ... FROM STDIN 语句，各批次共用，不再每批重新组装"""
+    return build_copy_sql(target_table, suffix, freeze=freeze)
+
+
+def uses_server_copy(file_paths):
+    """该批文件是否由服务端直接读取: 设置了 SERVER_TBL_DIR，且不含需要客户端解压的 .zst 文件"""
+    return SERVER_TBL_DIR is not None and all(fp.suffix != ZSTD_SUFFIX for fp in file_paths)
+
+
+def copy_batch_from_stdin(file_paths, conn, target_table, freeze=False):
+    """
+    在连接 conn 上将一批同格式文件合并为一条 COPY ... FROM STDIN 流式写入，返回导入行数。
+    (COPY FROM STDIN 不能在 pipeline 模式下执行。)
+    """
+    copy_sql = copy_from_stdin_sql(target_table, copy_format(file_paths[0]), freeze)
+    with conn.cursor() as cur:
+        with cur.copy(copy_sql) as cp:
+            for chunk in iter_batch_chunks(file_paths):
+                cp.write(chunk)
+        return cur.rowcount
+
+
+def copy_batch_from_server(file_paths, conn, target_table, freeze=False):
+    """
+    在连接 conn 上对一批文件逐个发送 COPY ... FROM '容器内路径'，由 PostgreSQL 直接读取文件，返回导入行数。
+    这些语句不经过 COPY 子协议，在 pipeline 中连续发送，整批只等待一次服务端响应。
+    """
+    with conn.pipeline():
+        cursors = [
+            conn.execute(build_copy_sql(target_table, copy_format(fp), f"{SERVER_TBL_DIR}/{fp.name}", freeze=freeze))
+            for fp in file_paths
+        ]
+    # 退出 pipeline 块时同步取回结果，之后 rowcount 才可用
+    return sum(cur.rowcount for cur in cursors)
+
+
+def import_file_batch(file_paths, pool, target_table):
+    """
+    从连接池取一个连接，将一批同格式文件合并为一条 COPY ... FROM STDIN 流式写入，返回导入行数。
+    不再对 _wa 父表加 SHARE UPDATE EXCLUSIVE 锁：COPY 自身持有的 ROW EXCLUSIVE 锁
+    互相兼容，多个线程可以同时向同一分区写入。
+    连接为 autocommit，单条 COPY 本身即是一个隐式事务 (失败时整批回滚)，
+    不再显式 BEGIN/COMMIT，每批省去两次网络往返。
+    """
+    with pool.connection() as conn:
+        return copy_batch_from_stdin(file_paths, conn, target_table)
+
+
+def import_file_batch_from_server(file_paths, pool, target_table):
+    """服务端导入模式: 从连接池取一个连接，在一个事务中由 PostgreSQL 直接读取一批文件，返回导入行数"""
+    with pool.connection() as conn:
+        with conn.pipeline(), conn.transaction():
+            return copy_batch_from_server(file_paths, conn, target_table)
 
-        # A. 写入 SQL 头部
-        proc.stdin.write(sql_header)
 
-        # B. 流式写入文件内容
-        has_trailing_newline = False
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(1024 * 1024):
-                proc.stdin.write(chunk)
-                if chunk:
-                    has_trailing_newline = chunk.endswith(b'\n')
+# 单批导入失败时记录到报告中、不终止整个导入的异常类型
+IMPORT_ERRORS = (psycopg.Error, ValueError, OSError, zstandard.ZstdError)
 
-        # C. 补换行符
-        if not has_trailing_newline:
-            proc.stdin.write(b'\n')
 
-        # D. 写入 SQL 尾部
-        proc.stdin.write(sql_footer)
+def import_batches_frozen(batches, pool, partition_name):
+    """
+    冻结导入模式: 在一个连接的单个事务中 TRUNCATE 目标分区，再依次用与并发模式相同的
+    copy_batch_from_stdin/copy_batch_from_server 对各批执行 COPY ... FREEZE。
+    返回与 batches 一一对应的结果，成功为 (导入行数, 耗时)，失败为异常；
+    任一批失败时整个事务回滚，出错批次的结果为原始异常，其余批次为说明已回滚的 RuntimeError。
+    """
+    results = []
+    try:
+        with pool.connection() as conn, conn.transaction():
+            conn.execute(sql.SQL("TRUNCATE ONLY {}").format(public_table(partition_name)))
+            for batch in batches:
+                copy_batch = copy_batch_from_server if uses_server_copy(batch) else copy_batch_from_stdin
+                results.append(timed_import(copy_batch, batch, conn, partition_name, True))
+    except IMPORT_ERRORS as e:
+        rolled_back = RuntimeError("冻结导入事务已回滚，本批数据未写入")
+        outcomes = [rolled_back] * len(batches)
+        # TRUNCATE 失败时记在第一批，提交失败时记在最后一批
+        outcomes[min(len(results), len(batches) - 1)] = e
+        return outcomes
+    return results
+
+
+def on_active_partition(partition, action):
+    """以当前写入分区名调用 action(分区名)；该分区已被删除时刷新分区名，重试一次"""
+    target_table = partition.name
+    try:
+        return action(target_table)
+    except psycopg.errors.UndefinedTable:
+        new_target = partition.refresh(target_table)
+        if new_target == target_table:
+            raise
+        logging.warning("写入分区 %s 已不存在，改为写入新分区 %s", target_table, new_target)
+        return action(new_target)
+
+
+def import_into_active_partition(file_paths, pool, partition, import_batch):
+    """用 import_batch 将一批文件导入当前写入分区，分区被滚动删除时改写新分区"""
+    return on_active_partition(partition, lambda target_table: import_batch(file_paths, pool, target_table))
 
-        # E. 获取输出
-        stdout_bytes, stderr_bytes = proc.communicate()
 
-        stdout_str = stdout_bytes.decode('utf-8', errors='replace')
-        stderr_str = stderr_bytes.decode('utf-8', errors='replace')
+def existing_tables(pool, table_names):
+    """返回 public 模式下 table_names 中仍然存在的表 (写入分区可能已被 GeoMesa 滚动删除)"""
+    with pool.connection() as conn:
+        return [
+            name for name in table_names
+            if conn.execute("SELECT to_regclass(%s) IS NOT NULL", (public_table(name).as_string(conn),)).fetchone()[0]
+        ]
 
-        if proc.returncode != 0:
-            raise subprocess.CalledProcessError(proc.returncode, psql_cmd, output=stdout_str, stderr=stderr_str)
 
-        return subprocess.CompletedProcess(args=psql_cmd, returncode=0, stdout=stdout_str, stderr=stderr_str)
+def make_batches(tbl_files):
+    """按格式分组后，每 BATCH_FILES 个文件组成一批"""
+    batches = []
+    for suffix in COPY_OPTIONS_BY_SUFFIX:
+        same_format = [fp for fp in tbl_files if copy_format(fp) == suffix]
+        for i in range(0, len(same_format), BATCH_FILES):
+            batches.append(same_format[i:i + BATCH_FILES])
+    return batches
 
-    except subprocess.CalledProcessError as e:
-        return subprocess.CompletedProcess(args=psql_cmd, returncode=e.returncode, stderr=e.stderr)
-    except Exception as e:
-        error_msg = f"Python Popen 异常: {str(e)}"
-        logging.error(error_msg)
-        if proc:
-            proc.kill()
-        return subprocess.CompletedProcess(args=psql_cmd, returncode=1, stderr=error_msg)
+
+def timed_import(import_batch, file_paths, *args):
+    """在工作线程中用 import_batch 执行一批文件的导入，返回 (导入行数, 耗时)"""
+    import_start = time.time()
+    rows = import_batch(file_paths, *args)
+    return rows, time.time() - import_start
 
 
 # ==================== 主逻辑 ====================
-def main():
+def main(keep_indexes=False):
     logging.info("=" * 50)
     start_total_time = time.time()
-    logging.info(f"开始全量数据导入流程 (带锁机制 - Python Popen优化版)...")
+    logging.info("开始全量数据导入流程 (psycopg 连接池 + 多线程并发 COPY 版)...")
     logging.info("=" * 50)
 
+    pool = create_pool()
+    try:
+        pool.open(wait=True)
+    except psycopg.Error as e:
+        logging.error("连接数据库失败，脚本终止: %s", e)
+        sys.exit(1)
+
     # 1. 清空目标表
-    logging.info(f"\n>>> 阶段 1: 清空数据 '{TARGET_TABLE_BASE}'...")
+    logging.info("\n>>> 阶段 1: 清空数据 '%s'...", TARGET_TABLE_BASE)
     try:
-        run_command(
-            f"docker exec -i {CONTAINER_NAME} psql -U {DB_USER} -d {DB_NAME} -c 'DELETE FROM {TARGET_TABLE_BASE};'"
-        )
+        truncated = truncate_feature_tables(pool)
+        if truncated:
+            logging.info("已用 TRUNCATE 清空 %d 张数据表。", truncated)
+        else:
+            # 未找到 GeoMesa 的数据表结构时，退回通过主表/视图逐行删除
+            with pool.connection() as conn:
+                conn.execute(delete_all_sql())
         logging.info("所有分区表已清空。")
-    except subprocess.CalledProcessError:
-        logging.error("清空表失败，脚本终止。")
+    except psycopg.Error as e:
+        logging.error("清空表失败，脚本终止: %s", e)
         sys.exit(1)
 
     # 2. 查找文件
-    logging.info(f"\n>>> 阶段 2: 查找数据文件...")
-    tbl_files = sorted(TBL_DIR_IN_LOCAL.glob("*.tbl"))
+    logging.info("\n>>> 阶段 2: 查找数据文件...")
+    tbl_files = sorted(p for p in TBL_DIR_IN_LOCAL.iterdir() if copy_format(p))
     total_files = len(tbl_files)
     if total_files == 0:
-        logging.error(f"在目录 '{TBL_DIR_IN_LOCAL}' 中未找到任何 .tbl 文件。")
+        logging.error("在目录 '%s' 中未找到任何 .tbl/.tbl.zst/.tblbin 文件。", TBL_DIR_IN_LOCAL)
         sys.exit(1)
-    logging.info(f"共找到 {total_files} 个文件需要导入。")
+    logging.info("共找到 %d 个文件需要导入。", total_files)
 
-    # 3. 循环导入
-    logging.info(f"\n>>> 阶段 3: 开始循环导入文件...")
-    success_count = 0
-    fail_count = 0
-    total_import_duration = 0.0
+    # 获取目标分区 (只查询一次，各批次共用；仅在分区被滚动删除时重新查询)
+    try:
+        partition_name = resolve_partition_name(pool)
+        logging.info("动态获取分区表名: %s", partition_name)
+    except (psycopg.Error, ValueError) as e:
+        logging.error("获取分区表名失败，脚本终止: %s", e)
+        sys.exit(1)
 
-    for i, file_path in enumerate(tbl_files, 1):
-        filename = file_path.name
-        logging.info(f"  -> 正在导入文件 {i}/{total_files}: {filename} ... ")
+    # 导入期间删除目标分区的二级索引，避免每行 COPY 都维护 GiST/B-Tree，导入完成后一次性重建
+    index_defs = []
+    if not keep_indexes:
+        try:
+            index_defs = drop_secondary_indexes(pool, partition_name)
+            logging.info("已删除分区 %s 上的 %d 个二级索引，导入完成后重建:", partition_name, len(index_defs))
+            for index_def in index_defs:
+                logging.info("    %s", index_def)
+        except psycopg.Error as e:
+            logging.error("删除二级索引失败，脚本终止: %s", e)
+            sys.exit(1)
+
+    # 删除索引之后的任何步骤失败 (包括 sys.exit 和意外异常)，都要在 finally 中恢复分区的 LOGGED 状态并重建索引，
+    # 不能让分区缺少索引或一直处于 UNLOGGED
+    index_duration = 0.0
+    partition_unlogged = False
+    try:
+        target_table = partition_name
+        # FREEZE 要求在同一事务中 TRUNCATE 写入的表，暂存表的数据最终经 INSERT ... SELECT 写入，无法冻结
+        use_staging = USE_STAGING_TABLE and not FREEZE_LOAD
+        if use_staging:
+            try:
+                target_table = create_staging_table(pool, partition_name)
+                logging.info("暂存导入模式: 数据先写入 UNLOGGED 暂存表 %s", target_table)
+            except psycopg.Error as e:
+                logging.error("创建暂存表失败，脚本终止: %s", e)
+                sys.exit(1)
+
+        if UNLOGGED_LOAD:
+            try:
+                set_partition_logged(pool, partition_name, logged=False)
+                partition_unlogged = True
+                logging.info("免日志导入模式: 分区 %s 已设为 UNLOGGED 并关闭 autovacuum", partition_name)
+            except psycopg.Error as e:
+                logging.error("切换分区为 UNLOGGED 失败，脚本终止: %s", e)
+                sys.exit(1)
+
+        if SERVER_TBL_DIR is not None:
+            logging.info("服务端导入模式: 由 PostgreSQL 直接读取容器内目录 %s 下的数据文件", SERVER_TBL_DIR)
+
+        # 3. 并发导入
+        batches = make_batches(tbl_files)
+        total_batches = len(batches)
+        if FREEZE_LOAD:
+            logging.info(
+                "\n>>> 阶段 3: 冻结导入模式，在单个事务中依次 COPY ... FREEZE (共 %d 批，每批最多 %d 个文件)...",
+                total_batches, BATCH_FILES
+            )
+        else:
+            logging.info(
+                "\n>>> 阶段 3: 开始并发导入文件 (线程数: %d, 共 %d 批，每批最多 %d 个文件)...",
+                MAX_WORKERS, total_batches, BATCH_FILES
+            )
+        success_count = 0
+        fail_count = 0
+        # COPY 返回的实际导入行数，以及按 .rows 文件得到的预期行数 (有文件缺少行数文件时为 None)
+        imported_rows = 0
+        expected_rows = 0
+        # 各批次 COPY 耗时之和，与阶段墙钟时间之比即实际达到的平均并发度
+        total_copy_duration = 0.0
+
+        partition = ActivePartition(pool, partition_name)
+
+        def submit_batch(executor, batch):
+            import_batch = import_file_batch_from_server if uses_server_copy(batch) else import_file_batch
+            if use_staging:
+                return executor.submit(timed_import, import_batch, batch, pool, target_table)
+            return executor.submit(timed_import, import_into_active_partition, batch, pool, partition, import_batch)
+
+        def iter_batch_results():
+            """按完成顺序生成 (批次, 结果)，结果为 (导入行数, 耗时) 或导致该批失败的异常"""
+            if FREEZE_LOAD:
+                yield from zip(batches, import_batches_frozen(batches, pool, partition_name))
+                return
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = {submit_batch(executor, batch): batch for batch in batches}
+                for fut in as_completed(futures):
+                    try:
+                        result = fut.result()
+                    except IMPORT_ERRORS as e:
+                        result = e
+                    yield futures[fut], result
 
         import_start = time.time()
-        result = import_single_file_with_lock(file_path)
-        import_end = time.time()
-        import_duration = import_end - import_start
-
-        if result.returncode == 0:
-            success_count += 1
-            total_import_duration += import_duration
-            logging.info(f"  -> 导入文件 {i}/{total_files}: {filename} ... ✅ (耗时: {import_duration:.3f}s)")
-        else:
-            fail_count += 1
-            logging.error(f"  -> 导入文件 {i}/{total_files}: {filename} ... ❌")
-            if result.stderr:
-                logging.error(f"      ⬇⬇⬇ SQL/Shell 错误详情 ⬇⬇⬇")
-                logging.error(f"{result.stderr.strip()}")
-                logging.error(f"      ⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆")
+        for i, (batch, result) in enumerate(iter_batch_results(), 1):
+            if isinstance(result, Exception):
+                fail_count += len(batch)
+                logging.error(
+                    "  -> 导入批次 %d/%d: %s ~ %s (%d 个文件) ... ❌", i, total_batches, batch[0].name, batch[-1].name, len(batch)
+                )
+                logging.error("      ⬇⬇⬇ SQL 错误详情 ⬇⬇⬇")
+                logging.error("%s", str(result).strip())
+                logging.error("      ⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆")
             else:
-                logging.error(f"      -> 未知错误 (无标准错误输出 returned)")
-
-    logging.info("\n所有文件导入尝试完毕。")
+                rows, import_duration = result
+                success_count += len(batch)
+                imported_rows += rows
+                batch_expected_rows = expected_row_count(batch)
+                if expected_rows is not None and batch_expected_rows is not None:
+                    expected_rows += batch_expected_rows
+                else:
+                    expected_rows = None
+                total_copy_duration += import_duration
+                logging.debug(
+                    "  -> 导入批次 %d/%d: %s ~ %s (%d 个文件) ... ✅ (%d 行, 耗时: %.3fs)",
+                    i, total_batches, batch[0].name, batch[-1].name, len(batch), rows, import_duration
+                )
+
+            if i % PROGRESS_LOG_BATCHES == 0 or i == total_batches:
+                logging.info(
+                    "  -> 进度: %d/%d 批 (成功 %d 个文件，失败 %d 个文件，已导入 %d 行)",
+                    i, total_batches, success_count, fail_count, imported_rows
+                )
+
+        if use_staging and success_count > 0:
+            logging.info("  -> 正在将暂存表 %s 写入目标分区 %s ...", target_table, partition.name)
+            try:
+                flush_start = time.time()
+                flushed_rows = on_active_partition(
+                    partition, lambda partition_table: flush_staging_table(pool, target_table, partition_table)
+                )
+                logging.info("  -> 写入 %d 行 ✅ (耗时: %.3fs)", flushed_rows, time.time() - flush_start)
+            except psycopg.Error as e:
+                logging.error("  -> 暂存表写入目标分区失败 (数据仍保留在 %s 中): %s", target_table, e)
+                fail_count += success_count
+                success_count = 0
+                imported_rows = 0
+                expected_rows = 0
+
+        logging.info("\n所有文件导入尝试完毕。")
+    finally:
+        # 导入期间原写入分区可能已被 GeoMesa 滚动删除，此时无需也无法恢复其 LOGGED 状态和索引
+        partition_gone = False
+        if partition_unlogged or index_defs:
+            try:
+                partition_gone = not existing_tables(pool, [partition_name])
+            except psycopg.Error:
+                pass
+            if partition_gone:
+                logging.warning("  -> 分区 %s 已在导入期间被滚动删除，跳过恢复 LOGGED 和重建索引", partition_name)
+
+        if partition_unlogged and not partition_gone:
+            # 无论导入是否成功 (包括被中断) 都恢复分区的持久性，SET LOGGED 会把整表写入 WAL，计入导入耗时
+            logging.info("  -> 正在恢复分区 %s 为 LOGGED 并重新启用 autovacuum ...", partition_name)
+            try:
+                restore_start = time.time()
+                set_partition_logged(pool, partition_name, logged=True)
+                logging.info("  -> 恢复完成 ✅ (耗时: %.3fs)", time.time() - restore_start)
+            except psycopg.Error as e:
+                logging.error("  -> 恢复分区 LOGGED 状态失败，请手动执行 ALTER TABLE ... SET LOGGED: %s", e)
+        load_end = time.time()
+
+        # 索引在恢复 LOGGED 之后再建: SET LOGGED 会重写整表并重建已有索引
+        if index_defs and not partition_gone:
+            logging.info("  -> 正在并发重建 %d 个二级索引 ...", len(index_defs))
+            index_start = time.time()
+            for index_def, e in recreate_indexes(pool, index_defs):
+                logging.error("  -> 重建索引失败，请手动执行: %s", index_def)
+                logging.error("%s", str(e).strip())
+            index_duration = time.time() - index_start
+            logging.info("  -> 索引重建结束 (耗时: %.3fs)", index_duration)
+
+    # 并发执行时各文件耗时相互重叠，吞吐量按阶段墙钟时间计算
+    # (暂存模式包含写入目标分区的时间，免日志模式包含恢复 LOGGED 的时间，不含重建索引的时间)
+    total_import_duration = load_end - import_start
 
     # 4. 生成报告
-    logging.info(f"\n>>> 阶段 4: 生成最终报告...")
+    logging.info("\n>>> 阶段 4: 生成最终报告...")
     logging.info("=" * 50)
 
     end_total_time = time.time()
     total_script_duration = end_total_time - start_total_time
-    logging.info(f"脚本总执行时间: {total_script_duration:.3f} 秒")
+    logging.info("脚本总执行时间: %.3f 秒", total_script_duration)
     logging.info("-" * 50)
-    logging.info(f"  - 成功导入文件数: {success_count}")
-    logging.info(f"  - 失败导入文件数: {fail_count}")
+    logging.info("  - 成功导入文件数: %d", success_count)
+    logging.info("  - 失败导入文件数: %d", fail_count)
+    logging.info("  - 导入行数: %d", imported_rows)
     logging.info("-" * 50)
 
     if success_count > 0:
-        total_rows_imported = success_count * ROWS_PER_FILE
         if total_import_duration > 0:
-            overall_throughput = int(total_rows_imported / total_import_duration)
+            overall_throughput = int(imported_rows / total_import_duration)
         else:
             overall_throughput = 0
-        logging.info(f"  - 纯导入吞吐量: {overall_throughput} 条/秒")
+        logging.info("  - 纯导入吞吐量: %d 条/秒", overall_throughput)
+        if index_defs:
+            logging.info("  - 二级索引重建耗时: %.3f 秒 (不计入纯导入吞吐量)", index_duration)
+        if total_import_duration > 0:
+            logging.info(
+                "  - 各批次 COPY 耗时合计: %.3f 秒 (平均并发度: %.1f / %d)",
+                total_copy_duration, total_copy_duration / total_import_duration, MAX_WORKERS
+            )
 
     logging.info("-" * 50)
 
-    # ==================== 最终数据量验证 (已修改) ====================
+    # ==================== 最终数据量验证 ====================
     logging.info("最终数据量验证...")
 
-    # 修改处：不再拼接 _wa 后缀，直接使用基础表名 "performance"
-    final_count_table = TARGET_TABLE_BASE
+    if expected_rows is None:
+        logging.info("  -> 部分数据文件缺少 %s 行数文件，以 COPY 返回的行数作为预期", ROWS_SUFFIX)
+        expected_rows = imported_rows
 
-    cmd = (
-        f"docker exec -i {CONTAINER_NAME} psql -U {DB_USER} -d {DB_NAME} -t -c 'SELECT count(1) FROM {final_count_table};'"
-        " 2>/dev/null | tr -d '[:space:]'"
-    )
     try:
-        result = run_command(cmd, check=False, capture_output=True)
-        final_count = result.stdout.strip()
-        if result.returncode == 0 and final_count and final_count.isdigit():
-            logging.info(f"  -> '{final_count_table}' 表 (主表/视图) 中的总记录数: {final_count}")
-            expected_rows = success_count * ROWS_PER_FILE
-            if int(final_count) == expected_rows:
-                logging.info("  -> 【成功】数据量与预期完全相符！")
-            else:
-                logging.warning(f"  -> 【警告】最终数据量 ({final_count}) 与预期 ({expected_rows}) 不符。")
-                logging.warning(f"      (提示：如果是首次全量导入，请确认之前的历史数据是否已清空，或者是否存在数据重复)")
+        # 阶段 1 已清空全部数据，只需统计本次写入的分区，不必扫描整个 performance 视图；
+        # 分区在导入中途被滚动时，新旧两个分区都要统计，已被删除的分区 (连同其中的数据) 无法统计
+        written_tables = sorted({partition_name, partition.name})
+        count_tables = existing_tables(pool, written_tables)
+        for table in written_tables:
+            if table not in count_tables:
+                logging.warning("  -> 分区 %s 已被滚动删除，其中的数据不计入最终数据量", table)
+        with pool.connection() as conn:
+            final_count = sum(
+                conn.execute(sql.SQL("SELECT count(1) FROM {}").format(public_table(table))).fetchone()[0]
+                for table in count_tables
+            )
+        logging.info("  -> 写入分区 %s 中的总记录数: %d", ", ".join(count_tables), final_count)
+        if final_count == expected_rows:
+            logging.info("  -> 【成功】数据量与预期完全相符！")
         else:
-            logging.warning("  -> 【警告】无法获取最终数据量统计。")
-    except Exception as e:
-        logging.warning(f"  -> 验证步骤发生错误: {e}")
+            logging.warning("  -> 【警告】最终数据量 (%d) 与预期 (%d) 不符。", final_count, expected_rows)
+            logging.warning("      (提示：如果是首次全量导入，请确认之前的历史数据是否已清空，或者是否存在数据重复)")
+    except psycopg.Error as e:
+        logging.warning("  -> 验证步骤发生错误: %s", e)
+    finally:
+        pool.close()
     logging.info("=" * 50)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="并发导入 .tbl/.tbl.zst/.tblbin 数据文件到 GeoMesa 的 PostGIS 写入分区")
+    parser.add_argument(
+        "--keep-indexes",
+        action="store_true",
+        help="导入期间保留目标分区上的二级索引 (默认先删除，导入完成后统一重建)"
+    )
+    args = parser.parse_args()
+    main(keep_indexes=args.keep_indexes)
\ No newline at end of file
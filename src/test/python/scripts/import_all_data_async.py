@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+import_all_data.py 的 asyncio + asyncpg 版本: 在单个事件循环中并发提交多条 COPY，
+以协程代替线程池。连接参数、数据目录、批次划分与 .tbl/.tblbin 拼接逻辑均复用 import_all_data。
+"""
+import asyncio
+import logging
+import sys
+import time
+
+import asyncpg
+
+from import_all_data import (
+    BATCH_FILES,
+    DB_HOST,
+    DB_NAME,
+    DB_PORT,
+    DB_USER,
+    PROGRESS_LOG_BATCHES,
+    TARGET_TABLE_BASE,
+    TBL_DIR_IN_LOCAL,
+    copy_format,
+    delete_all_sql,
+    expected_row_count,
+    feature_tables_sql,
+    iter_batch_chunks,
+    make_batches,
+    truncate_statements,
+)
+from tbl_format import ROWS_SUFFIX
+
+# ==================== 配置参数 ====================
+# 同时进行的 COPY 数 (即同时占用的连接数)
+MAX_CONCURRENCY = 16
+# asyncpg copy_to_table 的格式参数，与 import_all_data.COPY_OPTIONS_BY_SUFFIX 一一对应
+ASYNCPG_COPY_OPTIONS_BY_SUFFIX = {
+    ".tbl": {"format": "text", "delimiter": "|", "null": ""},
+    ".tblbin": {"format": "binary"},
+}
+
+# ==================== 核心导入函数 ====================
+async def aiter_batch_chunks(file_paths):
+    """在默认线程池中逐块驱动 iter_batch_chunks，避免磁盘读取阻塞事件循环"""
+    chunks = iter_batch_chunks(file_paths)
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+            # shield: 任务被取消时不丢弃线程中仍在执行的 next(chunks)，留给 finally 等待
+            if (chunk := await asyncio.shield(pending)) is None:
+                break
+            yield chunk
+    finally:
+        if pending is not None and not pending.done():
+            # 生成器仍在后台线程中执行时调用 close() 会抛出 ValueError，须等这一块读完
+            await asyncio.wait([pending])
+        chunks.close()
+
+
+async def truncate_feature_tables(pool):
+    """import_all_data.truncate_feature_tables 的 asyncpg 版本: 多条 TRUNCATE ONLY 在连接池上并发执行"""
+    tables = [tuple(record) for record in await pool.fetch(feature_tables_sql())]
+    await asyncio.gather(*(pool.execute(statement) for statement in truncate_statements(tables)))
+    return len(tables)
+
+
+async def resolve_partition_name(pool):
+    """查询 geomesa_wa_seq，返回当前活动的写入分区表名 (不带引号，由 asyncpg 负责转义)"""
+    partition_name = await pool.fetchval(
+        "SELECT $1::text || '_wa_' || lpad(value::text, 3, '0') "
+        "FROM \"public\".\"geomesa_wa_seq\" WHERE type_name = $1",
+        TARGET_TABLE_BASE,
+    )
+    if not partition_name:
+        raise ValueError("未能从 geomesa_wa_seq 获取分区名")
+    return partition_name
+
+
+async def import_file_batch(file_paths, pool, semaphore, partition_name):
+    """获取信号量与连接后，将一批同格式文件作为一条 COPY 写入目标分区，返回 (导入行数, 耗时)"""
+    async with semaphore, pool.acquire() as conn:
+        import_start = time.time()
+        status = await conn.copy_to_table(
+            partition_name,
+            source=aiter_batch_chunks(file_paths),
+            columns=["fid", "geom", "dtg", "taxi_id"],
+            schema_name="public",
+            **ASYNCPG_COPY_OPTIONS_BY_SUFFIX[copy_format(file_paths[0])],
+        )
+        # status 形如 'COPY 100000'
+        return int(status.split()[-1]), time.time() - import_start
+
+
+# ==================== 主逻辑 ====================
+async def main():
+    logging.info("=" * 50)
+    start_total_time = time.time()
+    logging.info("开始全量数据导入流程 (asyncio + asyncpg 并发 COPY 版)...")
+    logging.info("=" * 50)
+
+    try:
+        pool = await asyncpg.create_pool(
+            host=DB_HOST,
+            port=DB_PORT,
+            user=DB_USER,
+            database=DB_NAME,
+            min_size=MAX_CONCURRENCY // 2,
+            max_size=MAX_CONCURRENCY,
+            command_timeout=None,
+        )
+    except (OSError, asyncpg.PostgresError) as e:
+        logging.error("连接数据库失败，脚本终止: %s", e)
+        sys.exit(1)
+
+    try:
+        # 1. 清空目标表
+        logging.info("\n>>> 阶段 1: 清空数据 '%s'...", TARGET_TABLE_BASE)
+        try:
+            truncated = await truncate_feature_tables(pool)
+            if truncated:
+                logging.info("已用 TRUNCATE 清空 %d 张数据表。", truncated)
+            else:
+                # 未找到 GeoMesa 的数据表结构时，退回通过主表/视图逐行删除
+                await pool.execute(delete_all_sql())
+            logging.info("所有分区表已清空。")
+        except asyncpg.PostgresError as e:
+            logging.error("清空表失败，脚本终止: %s", e)
+            sys.exit(1)
+
+        # 2. 查找文件
+        logging.info("\n>>> 阶段 2: 查找数据文件...")
+        tbl_files = sorted(p for p in TBL_DIR_IN_LOCAL.iterdir() if copy_format(p))
+        if not tbl_files:
+            logging.error("在目录 '%s' 中未找到任何 .tbl/.tbl.zst/.tblbin 文件。", TBL_DIR_IN_LOCAL)
+            sys.exit(1)
+        logging.info("共找到 %d 个文件需要导入。", len(tbl_files))
+
+        try:
+            partition_name = await resolve_partition_name(pool)
+            logging.info("动态获取分区表名: %s", partition_name)
+        except (asyncpg.PostgresError, ValueError) as e:
+            logging.error("获取分区表名失败，脚本终止: %s", e)
+            sys.exit(1)
+
+        # 3. 并发导入
+        batches = make_batches(tbl_files)
+        total_batches = len(batches)
+        logging.info(
+            "\n>>> 阶段 3: 开始并发导入文件 (并发数: %d, 共 %d 批，每批最多 %d 个文件)...",
+            MAX_CONCURRENCY, total_batches, BATCH_FILES
+        )
+        success_count = 0
+        fail_count = 0
+        # COPY 返回的实际导入行数，以及按 .rows 文件得到的预期行数 (有文件缺少行数文件时为 None)
+        imported_rows = 0
+        expected_rows = 0
+        # 各批次 COPY 耗时之和，与阶段墙钟时间之比即实际达到的平均并发度
+        total_copy_duration = 0.0
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        import_start = time.time()
+        results = await asyncio.gather(
+            *(import_file_batch(batch, pool, semaphore, partition_name) for batch in batches),
+            return_exceptions=True,
+        )
+        for i, (batch, result) in enumerate(zip(batches, results), 1):
+            if isinstance(result, BaseException):
+                fail_count += len(batch)
+                logging.error(
+                    "  -> 导入批次 %d/%d: %s ~ %s (%d 个文件) ... ❌", i, total_batches, batch[0].name, batch[-1].name, len(batch)
+                )
+                logging.error("      ⬇⬇⬇ SQL 错误详情 ⬇⬇⬇")
+                logging.error("%s", str(result).strip())
+                logging.error("      ⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆")
+            else:
+                rows, import_duration = result
+                success_count += len(batch)
+                imported_rows += rows
+                batch_expected_rows = expected_row_count(batch)
+                if expected_rows is not None and batch_expected_rows is not None:
+                    expected_rows += batch_expected_rows
+                else:
+                    expected_rows = None
+                total_copy_duration += import_duration
+                logging.debug(
+                    "  -> 导入批次 %d/%d: %s ~ %s (%d 个文件) ... ✅ (%d 行, 耗时: %.3fs)",
+                    i, total_batches, batch[0].name, batch[-1].name, len(batch), rows, import_duration
+                )
+
+            if i % PROGRESS_LOG_BATCHES == 0 or i == total_batches:
+                logging.info(
+                    "  -> 进度: %d/%d 批 (成功 %d 个文件，失败 %d 个文件，已导入 %d 行)",
+                    i, total_batches, success_count, fail_count, imported_rows
+                )
+        total_import_duration = time.time() - import_start
+
+        logging.info("\n所有文件导入尝试完毕。")
+
+        # 4. 生成报告
+        logging.info("\n>>> 阶段 4: 生成最终报告...")
+        logging.info("=" * 50)
+        logging.info("脚本总执行时间: %.3f 秒", time.time() - start_total_time)
+        logging.info("-" * 50)
+        logging.info("  - 成功导入文件数: %d", success_count)
+        logging.info("  - 失败导入文件数: %d", fail_count)
+        logging.info("  - 导入行数: %d", imported_rows)
+        logging.info("-" * 50)
+        if success_count > 0 and total_import_duration > 0:
+            overall_throughput = int(imported_rows / total_import_duration)
+            logging.info("  - 纯导入吞吐量: %d 条/秒", overall_throughput)
+            logging.info(
+                "  - 各批次 COPY 耗时合计: %.3f 秒 (平均并发度: %.1f / %d)",
+                total_copy_duration, total_copy_duration / total_import_duration, MAX_CONCURRENCY
+            )
+        logging.info("-" * 50)
+
+        logging.info("最终数据量验证...")
+        if expected_rows is None:
+            logging.info("  -> 部分数据文件缺少 %s 行数文件，以 COPY 返回的行数作为预期", ROWS_SUFFIX)
+            expected_rows = imported_rows
+        try:
+            # 阶段 1 已清空全部数据，只统计本次写入的分区，不必扫描整个 performance 视图
+            final_count = await pool.fetchval(f'SELECT count(1) FROM "public"."{partition_name}"')
+            logging.info("  -> 写入分区 %s 中的总记录数: %d", partition_name, final_count)
+            if final_count == expected_rows:
+                logging.info("  -> 【成功】数据量与预期完全相符！")
+            else:
+                logging.warning("  -> 【警告】最终数据量 (%d) 与预期 (%d) 不符。", final_count, expected_rows)
+        except asyncpg.PostgresError as e:
+            logging.warning("  -> 验证步骤发生错误: %s", e)
+        logging.info("=" * 50)
+    finally:
+        await pool.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+import_all_data.py 的无 psycopg 版本: 通过 docker exec 在数据库容器内启动一个常驻的 psql 进程，
+依次将每批 .tbl 文件的 COPY 语句与数据写入其标准输入，整个导入只承担一次 docker exec + psql 的启动开销。
+只依赖标准库，供无法安装 psycopg 的环境使用 (因此不复用 import_all_data 的配置)；仅支持 .tbl 文本文件。
+"""
+import contextlib
+import logging
+import logging.handlers
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+
+from tbl_format import IO_BUFFER_SIZE
+
+# ==================== 日志配置 ====================
+SCRIPT_DIR = Path(__file__).parent.resolve()
+LOG_DIR = SCRIPT_DIR.parent / "logs"
+LOG_DIR.mkdir(exist_ok=True)
+
+LOG_FILE = LOG_DIR / f"import_log_{time.strftime('%Y%m%d')}.log"
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+# 日志文件经 MemoryHandler 缓冲: 攒满 LOG_BUFFER_RECORDS 条、出现 WARNING 及以上级别或进程退出时才批量写盘
+LOG_BUFFER_RECORDS = 1000
+
+file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
+file_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFMT))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format=LOG_FORMAT,
+    datefmt=LOG_DATEFMT,
+    handlers=[
+        logging.handlers.MemoryHandler(LOG_BUFFER_RECORDS, flushLevel=logging.WARNING, target=file_handler),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+# ==================== 配置参数 ====================
+CONTAINER_NAME = "my-postgis-container"
+DB_USER = "postgres"
+DB_NAME = "postgres"
+TARGET_TABLE_BASE = "performance"
+TBL_DIR_IN_LOCAL = Path("/data6/zhangdw/datasets/beijingshi_tbl_100k")
+# Linux (Python 3.10+) 上用 splice 将文件数据在内核中直接搬进 psql 的标准输入管道，不经过用户态缓冲区
+USE_SPLICE = hasattr(os, 'splice')
+COPY_OPTIONS = "WITH (FORMAT text, DELIMITER E'|', NULL E'')"
+# 每次 COPY 合并导入的文件数 (文本格式直接首尾拼接)，与 import_all_data.BATCH_FILES 含义相同
+BATCH_FILES = 16
+# 各批次的成功明细只以 DEBUG 级别输出，INFO 级别每完成这么多批汇总一次进度
+PROGRESS_LOG_BATCHES = 10
+# 每批 COPY 结束后，让 psql 回显一行 "标记 批次序号 是否出错 导入行数 错误信息"，据此判断该批是否导入成功
+SENTINEL = "__COPY_DONE__"
+# COPY 数据结束标记及回显标记行的命令，按批次序号 (%d) 填充后直接写入 psql
+COPY_END_TEMPLATE = f"\\.\n\\echo {SENTINEL} %d :ERROR :ROW_COUNT :LAST_ERROR_MESSAGE\n".encode('utf-8')
+# 一批数据写到一半时读取文件出错，补写这一行 (列数不符) 让服务端的 COPY 报错整体回滚。
+# 不能直接关闭标准输入或结束 docker exec: psql 会把 EOF 当作 COPY 数据结束，提交已写入的部分数据
+COPY_ABORT_LINE = b"\n__COPY_ABORTED_BY_CLIENT__\n"
+# 不设置 ON_ERROR_STOP: 单批 COPY 失败时 psql 继续执行后续批次，失败信息通过标记行返回
+PSQL_CMD = ["docker", "exec", "-i", CONTAINER_NAME, "psql", "-U", DB_USER, "-d", DB_NAME, "-X", "-q"]
+# 常驻 psql 的标准错误只保留最后几行，psql 意外退出时作为错误详情 (各批次的错误信息已随标记行返回)
+STDERR_TAIL_LINES = 5
+
+# ==================== 工具函数 ====================
+def run_psql(sql_text, want_output=True):
+    """
+    用一次性的 psql 进程执行单条 SQL，返回去除首尾空白的无格式输出。
+    want_output 为 False 时丢弃标准输出，返回 None；标准错误只在失败时随 CalledProcessError 读出。
+    """
+    result = subprocess.run(
+        PSQL_CMD + ["-tA", "-v", "ON_ERROR_STOP=1", "-c", sql_text],
+        check=True,
+        stdout=subprocess.PIPE if want_output else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    return result.stdout.strip() if want_output else None
+
+
+def ends_with_newline(f):
+    """已打开的二进制文件是否以换行符结尾 (空文件视为是)"""
+    if f.seek(0, 2) == 0:
+        return True
+    f.seek(-1, 2)
+    return f.read(1) == b'\n'
+
+
+def stream_file(f, pipe):
+    """将已打开的二进制文件 f 从头到尾写入管道 pipe (有缓冲的二进制写对象)"""
+    f.seek(0)
+    if not USE_SPLICE:
+        shutil.copyfileobj(f, pipe, IO_BUFFER_SIZE)
+        return
+    # splice 直接写管道的文件描述符，先把缓冲区中的 COPY 语句等内容刷出去，保证顺序
+    pipe.flush()
+    while os.splice(f.fileno(), pipe.fileno(), IO_BUFFER_SIZE):
+        pass
+
+
+class PsqlSession:
+    """
+    常驻的 psql 进程，所有批次写入同一个分区 (COPY 语句只组装一次)。
+    submit 将一批文件的 COPY 写入 psql 的标准输入后立即返回 Future，不等待执行结果；
+    后台线程读取 psql 回显的标记行，按批次序号完成对应的 Future，结果为 (导入行数, 从开始写入到导入完成的耗时)。
+    """
+
+    def __init__(self, partition_name):
+        self.copy_header = (
+            f"COPY public.\"{partition_name}\"(fid,geom,dtg,taxi_id) FROM STDIN {COPY_OPTIONS};\n".encode('utf-8')
+        )
+        self.proc = subprocess.Popen(PSQL_CMD, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.pending = {}  # 批次序号 -> (Future, 开始写入时间)
+        self.lock = threading.Lock()
+        self.stderr_lines = deque(maxlen=STDERR_TAIL_LINES)
+        self.next_index = 0
+        self.stdout_reader = threading.Thread(target=self._read_sentinels, daemon=True)
+        self.stderr_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self.stdout_reader.start()
+        self.stderr_reader.start()
+
+    def _read_sentinels(self):
+        for raw_line in self.proc.stdout:
+            parts = raw_line.decode('utf-8', errors='replace').rstrip('\n').split(' ', 4)
+            if parts[0] != SENTINEL:
+                continue
+            with self.lock:
+                entry = self.pending.pop(int(parts[1]), None)
+            if entry is None:
+                # submit 中途失败并已自行完成 Future 的批次
+                continue
+            future, start = entry
+            if parts[2] == 'true':
+                future.set_exception(RuntimeError(parts[4] if len(parts) > 4 else "未知错误"))
+            else:
+                future.set_result((int(parts[3]), time.time() - start))
+        # psql 已退出: 尚未完成的批次全部视为失败
+        self._fail_pending("psql 进程已退出")
+
+    def _read_stderr(self):
+        for raw_line in self.proc.stderr:
+            self.stderr_lines.append(raw_line.decode('utf-8', errors='replace').rstrip())
+
+    def _fail_pending(self, reason):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        detail = "\n".join(self.stderr_lines)
+        for future, _ in pending.values():
+            future.set_exception(RuntimeError(f"{reason}\n{detail}".strip()))
+
+    def _abandon(self, index, future, error):
+        """批次序号 index 尚未由后台线程完成时，以 error 结束其 Future"""
+        with self.lock:
+            still_pending = self.pending.pop(index, None) is not None
+        if still_pending:
+            future.set_exception(error)
+
+    def submit(self, file_paths):
+        """
+        将一批 .tbl 文件首尾拼接，作为一条 COPY 写入 psql，返回其 Future。
+        写入 COPY 语句前先打开该批全部文件，有文件打不开时不向 psql 写入任何内容；
+        写入中途读取文件出错时补写 COPY_ABORT_LINE 使这条 COPY 回滚，psql 仍与输入同步，可以继续提交后续批次。
+        只有 psql 的标准输入无法写入 (psql 已退出) 时才抛出 OSError。
+        """
+        future = Future()
+        with contextlib.ExitStack() as stack:
+            try:
+                files = [stack.enter_context(open(file_path, 'rb')) for file_path in file_paths]
+            except OSError as e:
+                future.set_exception(e)
+                return future
+
+            index = self.next_index
+            self.next_index += 1
+            with self.lock:
+                self.pending[index] = (future, time.time())
+
+            stdin = self.proc.stdin
+            try:
+                try:
+                    stdin.write(self.copy_header)
+                    for f in files:
+                        stream_file(f, stdin)
+                        # 补换行符，避免与下一个文件的首行拼在一起，并保证结束标记 \. 独占一行
+                        if not ends_with_newline(f):
+                            stdin.write(b'\n')
+                except OSError as e:
+                    # 本批以读取错误为准结束，服务端随后回报的 COPY 错误由后台线程忽略
+                    self._abandon(index, future, e)
+                    stdin.write(COPY_ABORT_LINE)
+                stdin.write(COPY_END_TEMPLATE % index)
+                stdin.flush()
+            except OSError as e:
+                # 管道已断开，psql 已不在运行，不会再提交任何数据
+                self._abandon(index, future, e)
+                self.proc.kill()
+                raise
+        return future
+
+    def close(self):
+        """关闭标准输入让 psql 执行完剩余命令后退出，等待所有 Future 完成"""
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait()
+        self.stdout_reader.join()
+        self.stderr_reader.join()
+
+
+# ==================== 主逻辑 ====================
+def main():
+    logging.info("=" * 50)
+    start_total_time = time.time()
+    logging.info("开始全量数据导入流程 (常驻 psql 进程版)...")
+    logging.info("=" * 50)
+
+    # 1. 清空目标表
+    logging.info("\n>>> 阶段 1: 清空数据 '%s'...", TARGET_TABLE_BASE)
+    try:
+        run_psql(f"DELETE FROM {TARGET_TABLE_BASE};", want_output=False)
+        logging.info("所有分区表已清空。")
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.error("清空表失败，脚本终止: %s", getattr(e, 'stderr', None) or e)
+        sys.exit(1)
+
+    # 2. 查找文件
+    logging.info("\n>>> 阶段 2: 查找数据文件...")
+    tbl_files = sorted(TBL_DIR_IN_LOCAL.glob("*.tbl"))
+    total_files = len(tbl_files)
+    if total_files == 0:
+        logging.error("在目录 '%s' 中未找到任何 .tbl 文件。", TBL_DIR_IN_LOCAL)
+        sys.exit(1)
+    logging.info("共找到 %d 个文件需要导入。", total_files)
+
+    try:
+        partition_name = run_psql(
+            f"SELECT '{TARGET_TABLE_BASE}_wa_' || lpad(value::text, 3, '0') "
+            f"FROM \"public\".\"geomesa_wa_seq\" WHERE type_name = '{TARGET_TABLE_BASE}'"
+        )
+        if not partition_name:
+            raise ValueError("未能从 geomesa_wa_seq 获取分区名")
+        logging.info("动态获取分区表名: %s", partition_name)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logging.error("获取分区表名失败，脚本终止: %s", getattr(e, 'stderr', None) or e)
+        sys.exit(1)
+
+    # 3. 通过常驻 psql 连续提交所有批次
+    batches = [tbl_files[i:i + BATCH_FILES] for i in range(0, total_files, BATCH_FILES)]
+    total_batches = len(batches)
+    logging.info(
+        "\n>>> 阶段 3: 开始通过常驻 psql 进程导入文件 (共 %d 批，每批最多 %d 个文件)...",
+        total_batches, BATCH_FILES
+    )
+    success_count = 0
+    fail_count = 0
+    # psql 回报的实际导入行数 (:ROW_COUNT)
+    imported_rows = 0
+
+    import_start = time.time()
+    session = PsqlSession(partition_name)
+    futures = []
+    for batch in batches:
+        try:
+            futures.append(session.submit(batch))
+        except OSError as e:
+            logging.error("写入 psql 失败，停止提交剩余批次: %s", e)
+            break
+    session.close()
+    total_import_duration = time.time() - import_start
+
+    for i, (batch, future) in enumerate(zip(batches, futures), 1):
+        try:
+            rows, duration = future.result()
+        except (OSError, RuntimeError) as e:
+            fail_count += len(batch)
+            logging.error(
+                "  -> 导入批次 %d/%d: %s ~ %s (%d 个文件) ... ❌", i, total_batches, batch[0].name, batch[-1].name, len(batch)
+            )
+            logging.error("      ⬇⬇⬇ SQL 错误详情 ⬇⬇⬇")
+            logging.error("%s", str(e).strip())
+            logging.error("      ⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆⬆")
+        else:
+            success_count += len(batch)
+            imported_rows += rows
+            logging.debug(
+                "  -> 导入批次 %d/%d: %s ~ %s (%d 个文件) ... ✅ (%d 行, 耗时: %.3fs)",
+                i, total_batches, batch[0].name, batch[-1].name, len(batch), rows, duration
+            )
+
+        if i % PROGRESS_LOG_BATCHES == 0 or i == len(futures):
+            logging.info(
+                "  -> 进度: %d/%d 批 (成功 %d 个文件，失败 %d 个文件，已导入 %d 行)",
+                i, total_batches, success_count, fail_count, imported_rows
+            )
+    # 未能提交的批次
+    fail_count += total_files - sum(len(batch) for batch in batches[:len(futures)])
+
+    logging.info("\n所有文件导入尝试完毕。")
+
+    # 4. 生成报告
+    logging.info("\n>>> 阶段 4: 生成最终报告...")
+    logging.info("=" * 50)
+    logging.info("脚本总执行时间: %.3f 秒", time.time() - start_total_time)
+    logging.info("-" * 50)
+    logging.info("  - 成功导入文件数: %d", success_count)
+    logging.info("  - 失败导入文件数: %d", fail_count)
+    logging.info("  - 导入行数: %d", imported_rows)
+    logging.info("-" * 50)
+    if success_count > 0 and total_import_duration > 0:
+        overall_throughput = int(imported_rows / total_import_duration)
+        logging.info("  - 纯导入吞吐量: %d 条/秒", overall_throughput)
+    logging.info("-" * 50)
+
+    logging.info("最终数据量验证...")
+    try:
+        # 阶段 1 已清空全部数据，只统计本次写入的分区，不必扫描整个 performance 视图
+        final_count = int(run_psql(f"SELECT count(1) FROM public.\"{partition_name}\";"))
+        logging.info("  -> 写入分区 %s 中的总记录数: %d", partition_name, final_count)
+        # 以 psql 回报的实际导入行数为预期，不依赖每个文件固定行数的假设
+        expected_rows = imported_rows
+        if final_count == expected_rows:
+            logging.info("  -> 【成功】数据量与预期完全相符！")
+        else:
+            logging.warning("  -> 【警告】最终数据量 (%d) 与预期 (%d) 不符。", final_count, expected_rows)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logging.warning("  -> 验证步骤发生错误: %s", e)
+    logging.info("=" * 50)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,162 @@
 import os
+import sys
 import glob
+import mmap
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from tbl_format import ROWS_SUFFIX
+
+# 扫描源文件换行符时每次处理的块大小 (4 MiB)
+BLOCK_SIZE = 4 << 20
+# Linux 的 sendfile 支持文件到文件的复制，数据在内核中直接搬运，不经过用户态缓冲区
+USE_SENDFILE = sys.platform.startswith('linux')
+# 并行扫描/生成文件的进程数 (机械硬盘上可适当调小，避免随机读写)
+MERGE_WORKERS = os.cpu_count()
+
+def read_row_count(file):
+    """读取文件旁的行数文件，不存在或无法解析时返回 None"""
+    try:
+        with open(file + ROWS_SUFFIX, 'r', encoding='utf-8') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+def ends_with_newline(file):
+    """文件是否以换行符结尾 (空文件视为是)"""
+    with open(file, 'rb') as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+def count_lines(file):
+    """
+    统计文件行数 (末行缺少换行符时也算一行)，返回 (行数, 末尾是否缺少换行符)。
+    有 .rows 行数文件时直接使用其中的行数，无需扫描整个文件。
+    """
+    row_count = read_row_count(file)
+    if row_count is not None and ends_with_newline(file):
+        return row_count, False
+
+    with open(file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0, False
+        # 只读映射文件，直接在页缓存上统计换行符，不把数据读入用户态缓冲区
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            count = sum(int(np.count_nonzero(data[pos:pos + BLOCK_SIZE] == 10)) for pos in range(0, size, BLOCK_SIZE))
+            missing_newline = bool(data[-1] != 10)
+            del data  # 释放对映射的引用后才能关闭 mmap
+    return count + missing_newline, missing_newline
+
+def line_end_offsets(file, line_numbers):
+    """返回文件中第 k 行 (k 依次取自递增的 line_numbers，从 1 开始计) 行尾换行符之后的字节偏移"""
+    offsets = []
+    targets = iter(line_numbers)
+    target = next(targets, None)
+    seen = 0  # 已扫过的换行符数
+    with open(file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = np.frombuffer(mm, dtype=np.uint8)
+        for pos in range(0, len(data), BLOCK_SIZE):
+            if target is None:
+                break
+            newlines = np.flatnonzero(data[pos:pos + BLOCK_SIZE] == 10)
+            while target is not None and target - seen <= len(newlines):
+                offsets.append(pos + int(newlines[target - seen - 1]) + 1)
+                target = next(targets, None)
+            seen += len(newlines)
+        del data  # 释放对映射的引用后才能关闭 mmap
+    return offsets
+
+def plan_merge(tbl_files, batch_size, executor):
+    """
+    第一遍 (各文件并行): 统计各源文件行数，确定每个输出文件由哪些源文件的哪些字节区间组成。
+    返回 [(输出行数, [(源文件, 起始偏移, 结束偏移, 是否补换行), ...]), ...]。
+    只有批次边界落在某个源文件内部时，才需要再扫描该文件定位边界所在的字节偏移。
+    """
+    # 并行统计行数；跳过无法读取的文件
+    counted = []
+    count_futures = [executor.submit(count_lines, file) for file in tbl_files]
+    for file, future in zip(tbl_files, count_futures):
+        try:
+            line_count, missing_newline = future.result()
+        except OSError as e:
+            print(f"警告：处理文件 {os.path.basename(file)} 时出错 - {str(e)}")
+            continue  # 跳过错误文件，继续处理下一个
+        if line_count > 0:
+            counted.append((file, line_count, missing_newline))
+
+    # 按文件顺序累计行数，得到每个文件内部的批次边界 (第 k 行之后切分)
+    cuts_by_file = []
+    filled = 0  # 当前输出文件已分配的行数
+    for file, line_count, _ in counted:
+        cuts_by_file.append(list(range(batch_size - filled, line_count, batch_size)))
+        filled = (filled + line_count) % batch_size
+
+    # 并行定位落在文件内部的批次边界的字节偏移
+    offset_futures = [
+        executor.submit(line_end_offsets, file, cuts) if cuts else None
+        for (file, _, _), cuts in zip(counted, cuts_by_file)
+    ]
+
+    outputs = []
+    segments = []
+    filled = 0
+    for (file, line_count, missing_newline), future in zip(counted, offset_futures):
+        file_size = os.path.getsize(file)
+        bounds = [0] + (future.result() if future else []) + [file_size]
+        for i, (start, end) in enumerate(zip(bounds, bounds[1:])):
+            if i > 0:
+                outputs.append((batch_size, segments))
+                segments = []
+            segments.append((file, start, end, missing_newline and end == file_size))
+        filled = (filled + line_count) % batch_size
+        # 恰好在文件末尾填满一批
+        if filled == 0:
+            outputs.append((batch_size, segments))
+            segments = []
+
+    if segments:
+        outputs.append((filled, segments))
+    return outputs
+
+def copy_range(out_f, in_f, offset, count):
+    """
+    将 in_f 中 [offset, offset + count) 的字节追加到 out_f (无缓冲)。
+    Linux 上用 sendfile 在内核中复制；其他平台映射源文件后直接写出 memoryview 切片，不经过中间缓冲区。
+    """
+    if count == 0:
+        return
+    if USE_SENDFILE:
+        while count > 0:
+            sent = os.sendfile(out_f.fileno(), in_f.fileno(), offset, count)
+            if sent == 0:
+                raise OSError(f"源文件 {in_f.name} 在合并过程中被截断")
+            offset += sent
+            count -= sent
+        return
+
+    end = offset + count
+    with mmap.mmap(in_f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        if end > len(mm):
+            raise OSError(f"源文件 {in_f.name} 在合并过程中被截断")
+        while offset < end:
+            offset += out_f.write(view[offset:end])
+
+def write_merged_file(output_file, segments, line_count):
+    """第二遍 (各输出文件并行): 按计划依次拷贝各源文件的字节区间，生成一个合并文件及其行数文件"""
+    with open(output_file, 'wb', buffering=0) as out_f:
+        for file, start, end, add_newline in segments:
+            with open(file, 'rb') as in_f:
+                copy_range(out_f, in_f, start, end - start)
+            if add_newline:
+                # 补上源文件末行缺少的换行符，避免与下一个文件的首行拼在一起
+                out_f.write(b'\n')
+    with open(output_file + ROWS_SUFFIX, 'w', encoding='utf-8') as f:
+        f.write(str(line_count))
 
 def merge_tbl_by_lines(src_dir, batch_size):
     # 验证源文件夹是否存在
@@ -19,50 +176,34 @@ def merge_tbl_by_lines(src_dir, batch_size):
     os.makedirs(dst_dir, exist_ok=True)
     print(f"输出目录已创建（与源文件夹同级）：{dst_dir}")
 
-    # 初始化变量：当前累计行数、当前批次内容、输出文件序号
-    current_line_count = 0  # 累计当前批次的行数
-    current_batch = []      # 存储当前批次的内容
-    file_index = 0          # 输出文件的序号（如merged_0.tbl、merged_1.tbl）
-
-    # 遍历所有.tbl文件，逐行处理
-    for file in tbl_files:
-        file_name = os.path.basename(file)
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                print(f"开始处理文件：{file_name}")
-                for line in f:
-                    # 保留行尾换行符（如果需要去除空行可加判断：if line.strip()）
-                    current_batch.append(line)
-                    current_line_count += 1
-
-                    # 当累计行数达到10000时，写入文件并重置
-                    if current_line_count >= batch_size:
-                        # 生成输出文件名
-                        output_file = os.path.join(dst_dir, f"merged_{file_index}.tbl")
-                        # 写入当前批次内容
-                        with open(output_file, 'w', encoding='utf-8') as out_f:
-                            out_f.writelines(current_batch)
-                        print(f"已生成文件：{output_file}（{current_line_count}行）")
-                        # 重置计数器和缓冲区
-                        current_line_count = 0
-                        current_batch = []
-                        file_index += 1
-        except Exception as e:
-            print(f"警告：处理文件 {file_name} 时出错 - {str(e)}")
-            continue  # 跳过错误文件，继续处理下一个
+    with ProcessPoolExecutor(max_workers=MERGE_WORKERS) as executor:
+        # 先规划每个输出文件的内容，各输出文件互不依赖，再由进程池并行拷贝字节区间生成
+        print(f"开始扫描 {len(tbl_files)} 个源文件...")
+        outputs = plan_merge(tbl_files, batch_size, executor)
+        futures = {
+            # 生成输出文件名（如merged_0.tbl、merged_1.tbl）
+            executor.submit(write_merged_file, os.path.join(dst_dir, f"merged_{file_index}.tbl"), segments, line_count):
+                (file_index, line_count)
+            for file_index, (line_count, segments) in enumerate(outputs)
+        }
 
-    # 处理剩余不足10000行的内容
-    if current_batch:
-        output_file = os.path.join(dst_dir, f"merged_{file_index}.tbl")
-        with open(output_file, 'w', encoding='utf-8') as out_f:
-            out_f.writelines(current_batch)
-        print(f"已生成文件：{output_file}（{current_line_count}行，最后一批）")
-        file_index += 1
+        fail_count = 0
+        for future in as_completed(futures):
+            file_index, line_count = futures[future]
+            output_file = os.path.join(dst_dir, f"merged_{file_index}.tbl")
+            try:
+                future.result()
+            except OSError as e:
+                fail_count += 1
+                print(f"警告：生成文件 {output_file} 时出错 - {str(e)}")
+                continue
+            last_note = "，最后一批" if line_count < batch_size else ""
+            print(f"已生成文件：{output_file}（{line_count}行{last_note}）")
 
-    print(f"\n所有文件处理完成！共生成 {file_index} 个合并文件")
+    print(f"\n所有文件处理完成！共生成 {len(outputs) - fail_count} 个合并文件")
 
 # 使用示例
 if __name__ == "__main__":
     # 替换为你的.tbl文件所在文件夹路径
     source_directory = r"D:\datasets\beijingshi_tbl"
-    merge_tbl_by_lines(source_directory, batch_size=5_000_000)
\ No newline at end of file
+    merge_tbl_by_lines(source_directory, batch_size=5_000_000)
@@ -0,0 +1,14 @@
+"""
+数据文件格式的共享常量: 由 csv_to_tbl_converter / tbl_to_tblbin_converter / merge_tbl 写出，
+由 import_all_data 及其 asyncpg、psql 版本读取。只依赖标准库，导入脚本无需加载 numpy/numba。
+"""
+
+# 文件读写缓冲区大小 (8 MiB)，顺序大块读写以减少系统调用次数
+IO_BUFFER_SIZE = 1 << 23
+# 与数据文件同名的行数文件后缀 (如 1.tbl.rows、merged_0.tbl.rows)：merge_tbl 据此跳过换行符扫描直接整体拷贝文件，
+# import_all_data 据此得到精确的预期导入行数
+ROWS_SUFFIX = ".rows"
+# PostgreSQL 二进制 COPY 格式: 11 字节签名 + 4 字节标志位 + 4 字节头部扩展长度，结尾为 int16 的 -1。
+# 合并导入多个 .tblbin 时只保留一份文件头和结尾标记
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + (0).to_bytes(4, 'big') + (0).to_bytes(4, 'big')
+PGCOPY_TRAILER = (-1).to_bytes(2, 'big', signed=True)
@@ -0,0 +1,155 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+from csv_to_tbl_converter import (
+    EWKB_POINT_DTYPE,
+    UUID_TEXT_LEN,
+    ewkb_points,
+    write_row_count,
+    write_tblbin,
+)
+from tbl_format import IO_BUFFER_SIZE
+
+# .tbl 文件的列 (无表头，'|' 分隔)
+TBL_COLUMNS = ['fid', 'geom', 'dtg', 'taxi_id']
+# 旧版 .tbl 中 geom 为 'SRID=4326;POINT(lng lat)' 形式的 EWKT，新版为十六进制 EWKB
+WKT_POINT_PATTERN = r'POINT\s*\((?P<lng>\S+)\s+(?P<lat>[^)\s]+)\)'
+
+# 十六进制字符 -> 半字节值的查找表
+HEX_VALUES = np.zeros(256, dtype=np.uint8)
+HEX_VALUES[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+HEX_VALUES[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16)
+HEX_VALUES[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+
+def fixed_width_bytes(column, width):
+    """将每个值都恰好为 width 字节的字符串列零拷贝地视为 (n, width) 的 uint8 矩阵，长度不符时抛出 ValueError"""
+    array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if len(array) and pc.min_max(pc.binary_length(array)).as_py() != {'min': width, 'max': width}:
+        raise ValueError(f"列中存在长度不为 {width} 的值")
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int32)[array.offset:array.offset + len(array) + 1]
+    data = np.frombuffer(array.buffers()[2], dtype=np.uint8) if len(array) else np.empty(0, dtype=np.uint8)
+    return data[offsets[0]:offsets[-1]].reshape(len(array), width)
+
+def hex_decode(hex_bytes):
+    """将 (n, 2k) 的十六进制字符矩阵解码为 (n, k) 的字节矩阵"""
+    nibbles = HEX_VALUES[hex_bytes]
+    return (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+
+def hex_ewkb_points(geom):
+    """将十六进制 EWKB 文本列解码为 EWKB 点数组"""
+    raw = hex_decode(fixed_width_bytes(geom, 2 * EWKB_POINT_DTYPE.itemsize))
+    return np.ascontiguousarray(raw).view(EWKB_POINT_DTYPE).ravel()
+
+def wkt_points(geom):
+    """将 EWKT 文本列 ('SRID=4326;POINT(lng lat)') 解析为 EWKB 点数组"""
+    coords = pc.extract_regex(geom, WKT_POINT_PATTERN)
+    lng = pc.struct_field(coords, 'lng').cast(pa.float64()).to_numpy()
+    lat = pc.struct_field(coords, 'lat').cast(pa.float64()).to_numpy()
+    return ewkb_points(lng, lat)
+
+def geom_points(geom):
+    """将 geom 列 (十六进制 EWKB 或旧版 EWKT，可在同一文件中混用) 转换为 EWKB 点数组"""
+    is_wkt = pc.fill_null(pc.or_(pc.starts_with(geom, 'SRID='), pc.starts_with(geom, 'POINT')), False)
+    wkt_count = pc.sum(is_wkt).as_py() or 0
+    if wkt_count == 0:
+        return hex_ewkb_points(geom)
+    if wkt_count == len(geom):
+        return wkt_points(geom)
+
+    # 按行判断格式: 两种格式分别解码后按原顺序写回
+    mask = is_wkt.to_numpy(zero_copy_only=False)
+    points = np.empty(len(geom), dtype=EWKB_POINT_DTYPE)
+    points[mask] = wkt_points(geom.filter(is_wkt))
+    points[~mask] = hex_ewkb_points(geom.filter(pc.invert(is_wkt)))
+    return points
+
+def convert_tbl_folder_to_tblbin(input_folder):
+    """
+    将一个文件夹中已有的 .tbl 文件 (包括 merge_tbl 合并后的文件) 转换为二进制 COPY 格式的 .tblbin 文件，
+    保存到同级的 _tblbin 文件夹中。无需回到原始 CSV 重新生成。
+    """
+    if not os.path.isdir(input_folder):
+        print(f"错误：输入目录 '{input_folder}' 不存在或不是一个目录。")
+        return
+
+    parent_dir = os.path.dirname(input_folder)
+    folder_name = os.path.basename(input_folder)
+    output_folder = os.path.join(parent_dir, f"{folder_name}_tblbin")
+
+    try:
+        os.makedirs(output_folder, exist_ok=True)
+        print(f".tblbin文件将被保存到: {output_folder}")
+    except OSError as e:
+        print(f"错误：创建输出目录 '{output_folder}' 失败: {e}")
+        return
+
+    tbl_files = sorted(f for f in os.listdir(input_folder) if f.endswith('.tbl'))
+    total_files = len(tbl_files)
+    if total_files == 0:
+        print("在指定目录中未找到任何.tbl文件。")
+        return
+
+    print(f"共找到 {total_files} 个.tbl文件需要转换。")
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {
+            executor.submit(
+                convert_single_tbl_to_tblbin,
+                os.path.join(input_folder, filename),
+                os.path.join(output_folder, os.path.splitext(filename)[0] + '.tblbin'),
+            ): filename
+            for filename in tbl_files
+        }
+
+        for i, future in enumerate(as_completed(futures), start=1):
+            filename = futures[future]
+            print(f"\n[进度: {i}/{total_files}] 已处理文件: '{filename}'")
+
+            try:
+                future.result()
+            except Exception as e:
+                print(f"  处理文件 '{filename}' 时发生未知错误: {e}")
+
+    print("\n所有文件处理完毕！")
+
+def convert_single_tbl_to_tblbin(tbl_path, tblbin_path):
+    """读取单个 .tbl 文件 (fid|geom|dtg|taxi_id)，按列转换后写出对应的 .tblbin 文件"""
+    with pa.input_stream(tbl_path, buffer_size=IO_BUFFER_SIZE) as source:
+        table = pa_csv.read_csv(
+            source,
+            read_options=pa_csv.ReadOptions(column_names=TBL_COLUMNS, block_size=IO_BUFFER_SIZE),
+            parse_options=pa_csv.ParseOptions(
+                delimiter='|',
+                quote_char=False,
+                double_quote=False,
+                escape_char=False,
+                newlines_in_values=False
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                timestamp_parsers=[pa_csv.ISO8601],
+                column_types={'fid': pa.string(), 'geom': pa.string(), 'dtg': pa.timestamp('s'), 'taxi_id': pa.int32()}
+            )
+        )
+
+    line_count = table.num_rows
+    fid_bytes = fixed_width_bytes(table['fid'], UUID_TEXT_LEN)
+    points = geom_points(table['geom'].combine_chunks())
+    dtg_seconds = table['dtg'].cast(pa.int64()).to_numpy()
+    taxi_id = table['taxi_id'].to_numpy()
+
+    write_tblbin(tblbin_path, fid_bytes, points, dtg_seconds, taxi_id)
+    write_row_count(tblbin_path, line_count)
+    print(f"  处理完成，成功转换 {line_count} 行数据到 '{os.path.basename(tblbin_path)}'。")
+
+
+# --- 主程序入口 ---
+if __name__ == "__main__":
+    # 替换为 .tbl 文件所在文件夹路径
+    tbl_folder_path = r"D:\datasets\beijingshi_tbl"
+
+    convert_tbl_folder_to_tblbin(tbl_folder_path)